@@ -0,0 +1,320 @@
+"""Benchmarks for matchers, TmpDir and waiters.
+
+Results are written as JSON, and compared against a baseline from an earlier
+run (usually on the same machine) to catch regressions:
+
+    python benchmarks.py --output bench.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import operator
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from pytest_test_utils import TmpDir
+from pytest_test_utils.matchers import Matcher as M
+from pytest_test_utils.waiters import wait_until
+
+if TYPE_CHECKING:
+    from pytest_test_utils.tmp_dir import StrStruct
+
+SCHEMA_VERSION = 1
+TREE_SIZES = (1_000, 10_000, 100_000)
+PAYLOAD_SIZES = (100, 1_000, 10_000, 100_000)
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: Callable[[], Any]
+    # called before each round, outside of the timed section
+    setup: Optional[Callable[[], None]] = None
+    teardown: Optional[Callable[[], None]] = None
+    # calls per round, for operations too fast to time individually
+    number: int = 1
+
+
+def _struct(files: int) -> "StrStruct":
+    per_dir = 1_000
+    return {
+        f"dir{d}": {f"file{f}": f"contents of {d}/{f}\n" for f in range(per_dir)}
+        for d in range(max(files // per_dir, 1))
+    }
+
+
+def _recreate(path: TmpDir) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir()
+
+
+def _create_once(path: TmpDir, struct: "StrStruct") -> None:
+    if not path.exists():
+        path.mkdir()
+        path.gen(struct, jobs=8)
+
+
+def _tree_benchmarks(root: Path) -> Iterator[Benchmark]:
+    for files in TREE_SIZES:
+        struct = _struct(files)
+        gen_dir = TmpDir(root / f"gen-{files}")
+        cat_dir = TmpDir(root / f"cat-{files}")
+        yield Benchmark(
+            f"tmp_dir.gen[{files}]",
+            partial(gen_dir.gen, struct),
+            setup=partial(_recreate, gen_dir),
+        )
+        yield Benchmark(
+            f"tmp_dir.gen[{files}, jobs=8]",
+            partial(gen_dir.gen, struct, jobs=8),
+            setup=partial(_recreate, gen_dir),
+        )
+        yield Benchmark(
+            f"tmp_dir.cat[{files}]",
+            cat_dir.cat,
+            setup=partial(_create_once, cat_dir, struct),
+        )
+
+
+def _all_equal(objs: List[Any], pattern: Any) -> bool:
+    return all(obj == pattern for obj in objs)
+
+
+def _unordered_eq(items: List[Any], other: List[Any]) -> bool:
+    return M.unordered(*items) == other
+
+
+def _regex_eq(text: str, *args: Any, **kwargs: Any) -> bool:
+    return M.re(*args, **kwargs) == text
+
+
+def _matcher_benchmarks() -> Iterator[Benchmark]:
+    for size in PAYLOAD_SIZES:
+        number = max(100_000 // size, 1)
+
+        data = {f"key{i}": i for i in range(size)}
+        expected = M.dict({f"key{i}": i for i in range(0, size, 2)})
+        yield Benchmark(
+            f"M.dict[{size}]", partial(operator.eq, data, expected), number=number
+        )
+
+        items = list(range(size))
+        yield Benchmark(
+            f"M.unordered[{size}]",
+            partial(_unordered_eq, items, items[::-1]),
+            number=number,
+        )
+        records = [{"id": i, "tags": [str(i)]} for i in range(size)]
+        yield Benchmark(
+            f"M.unordered[{size}, dicts]",
+            partial(_unordered_eq, records, records[::-1]),
+            number=number,
+        )
+
+        yield Benchmark(
+            f"M.any_of[{size}]",
+            partial(operator.eq, M.any_of(*items), size - 1),
+            number=100_000,
+        )
+
+        objs = [SimpleNamespace(id=i, name=f"obj{i}", value=i * 2) for i in range(size)]
+        pattern = M.attrs(name=M.re(r"^obj\d+$"), value=M.instance_of(int))
+        yield Benchmark(
+            f"M.attrs[{size}]",
+            partial(_all_equal, objs, pattern),
+            number=max(number // 10, 1),
+        )
+        yield Benchmark(
+            f"M.compile[{size}]",
+            partial(M.compile(pattern).match_all, objs),
+            number=max(number // 10, 1),
+        )
+
+        nested = [
+            SimpleNamespace(name=f"obj{i}", id=i, meta={"kind": "x"})
+            for i in range(size)
+        ]
+        pattern = M(
+            name=M.re(r"^obj\d+$"), id=M.instance_of(int), meta=M.dict(kind="x")
+        )
+        yield Benchmark(
+            f"M.attrs[{size}, nested]",
+            partial(_all_equal, nested, pattern),
+            number=max(number // 10, 1),
+        )
+        yield Benchmark(
+            f"M.compile[{size}, nested]",
+            partial(M.compile(pattern).match_all, nested),
+            number=max(number // 10, 1),
+        )
+
+        timestamps = [datetime(2021, 1, 1) + timedelta(seconds=i) for i in range(size)]
+        shifted = [value + timedelta(milliseconds=10) for value in timestamps]
+        yield Benchmark(
+            f"M.approx[{size}, datetimes]",
+            partial(operator.eq, shifted, M.approx(timestamps)),
+            number=number,
+        )
+
+        text = "lorem ipsum dolor sit amet\n" * size + "needle"
+        yield Benchmark(
+            f"M.re[{size}]", partial(_regex_eq, text, r"needle$"), number=number
+        )
+        # an anchored pattern that fails on the first character
+        yield Benchmark(
+            f"M.re[{size}, fullmatch]",
+            partial(_regex_eq, text, r"ipsum.*", re.DOTALL, mode="fullmatch"),
+            number=number,
+        )
+
+
+def _waiter_benchmarks() -> Iterator[Benchmark]:
+    yield Benchmark(
+        "wait_until[immediate]",
+        lambda: wait_until(lambda: True, timeout=1),
+        number=10_000,
+    )
+
+    def ready_after(polls: int) -> Callable[[], bool]:
+        calls = iter(range(polls))
+        return lambda: next(calls, None) is None
+
+    yield Benchmark(
+        "wait_until[100 polls, pause=0]",
+        lambda: wait_until(ready_after(100), timeout=10, pause=0),
+        number=100,
+    )
+
+
+def collect(root: Path) -> Iterator[Benchmark]:
+    yield from _tree_benchmarks(root)
+    yield from _matcher_benchmarks()
+    yield from _waiter_benchmarks()
+
+
+def _format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.2f}us"
+
+
+def run(benchmark: Benchmark, rounds: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(rounds):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        start = time.perf_counter()
+        for _ in range(benchmark.number):
+            benchmark.func()
+        times.append((time.perf_counter() - start) / benchmark.number)
+        if benchmark.teardown is not None:
+            benchmark.teardown()
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "rounds": rounds,
+        "number": benchmark.number,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float,
+) -> List[str]:
+    """Print a comparison to the baseline, and return regressed benchmarks."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["min"], result["min"]
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<40} {_format_time(before):>10} {_format_time(after):>10} "
+            f"{change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="keyword", help="only run benchmarks matching")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail if any benchmark is slower than the baseline by more than "
+        "this fraction (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write the results to --baseline instead of comparing to it",
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="pytest-test-utils-bench-") as tmp:
+        for benchmark in collect(Path(tmp)):
+            if args.keyword and args.keyword not in benchmark.name:
+                continue
+            results[benchmark.name] = result = run(benchmark, args.rounds)
+            print(f"{benchmark.name:<40} {_format_time(result['min']):>10}", flush=True)
+
+    data = {
+        "version": SCHEMA_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    if args.baseline is None:
+        return 0
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}, skipping comparison")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    print(f"\ncompared to {args.baseline} (threshold {args.threshold:.0%}):")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
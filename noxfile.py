@@ -6,7 +6,7 @@ import nox
 
 nox.options.reuse_existing_virtualenvs = True
 nox.options.sessions = "lint", "tests"
-locations = "pytest_test_utils", "tests.py"
+locations = "pytest_test_utils", "tests.py", "benchmarks.py"
 
 
 @nox.session(python=["3.8", "3.9", "3.10", "3.11", "3.12"])
@@ -32,6 +32,25 @@ def lint(session: nox.Session) -> None:
     session.run("python", "-m", "mypy")
 
 
+@nox.session
+def bench(session: nox.Session) -> None:
+    """Run the benchmarks, and compare them to the baseline if there's one.
+
+    Use `nox -s bench -- --save-baseline` to store a new baseline, e.g. before
+    starting work on a change.
+    """
+    session.install(".")
+    session.run(
+        "python",
+        "benchmarks.py",
+        "--output",
+        ".benchmarks/latest.json",
+        "--baseline",
+        ".benchmarks/baseline.json",
+        *session.posargs,
+    )
+
+
 @nox.session
 def build(session: nox.Session) -> None:
     session.install("build", "setuptools", "twine")
@@ -1,10 +1,47 @@
-from . import matchers, waiters
-from .tmp_dir import TmpDir
-from .tmp_dir_factory import TempDirFactory
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from . import matchers, waiters
+    from .golden import GoldenSnapshot
+    from .perf import Perf
+    from .template_cache import TemplateCache
+    from .tmp_dir import TmpDir
+    from .tmp_dir_factory import TempDirFactory
 
 __all__ = [
     "matchers",
     "waiters",
     "TmpDir",
     "TempDirFactory",
+    "TemplateCache",
+    "GoldenSnapshot",
+    "Perf",
 ]
+
+# Public names are imported on first access, so that loading the pytest plugin
+# does not import everything in every pytest process.
+_lazy = {
+    "matchers": (".matchers", None),
+    "waiters": (".waiters", None),
+    "TmpDir": (".tmp_dir", "TmpDir"),
+    "TempDirFactory": (".tmp_dir_factory", "TempDirFactory"),
+    "TemplateCache": (".template_cache", "TemplateCache"),
+    "GoldenSnapshot": (".golden", "GoldenSnapshot"),
+    "Perf": (".perf", "Perf"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attr = _lazy[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *__all__})
@@ -1,20 +1,28 @@
+import operator
+import sys
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, List, Optional, Sequence, Union
 
 from _pytest.python_api import ApproxBase
 
+from ._repr import bounded_repr
+
+DateTimeOrDelta = Union[datetime, timedelta]
+
 
 class approx_datetime(ApproxBase):
     """Perform approximate comparisons between datetime or timedelta."""
 
     default_tolerance = timedelta(seconds=1)
-    expected: datetime
+    expected: DateTimeOrDelta
     abs: timedelta
 
-    def __init__(self, expected: datetime, abs: Optional[timedelta] = None) -> None:
+    def __init__(
+        self, expected: DateTimeOrDelta, abs: Optional[timedelta] = None
+    ) -> None:
         """Initialize the approx_datetime with `abs` as tolerance."""
-        assert isinstance(expected, datetime)
-        abs = abs or self.default_tolerance
+        assert isinstance(expected, (datetime, timedelta))
+        abs = self.default_tolerance if abs is None else abs
         assert abs >= timedelta(0), f"absolute tolerance can't be negative: {abs}"
         super().__init__(expected, abs=abs)
 
@@ -24,5 +32,107 @@ class approx_datetime(ApproxBase):
 
     def __eq__(self, actual: object) -> bool:
         """Checking for equality with certain amount of tolerance."""
-        assert isinstance(actual, datetime), "expected type of datetime"
-        return abs(self.expected - actual) <= self.abs
+        # subclasses, e.g. pandas.Timestamp, compare like their base class
+        kind = datetime if isinstance(self.expected, datetime) else timedelta
+        assert isinstance(actual, kind), f"expected type of {kind.__name__}"
+        delta: timedelta = abs(self.expected - actual)  # type: ignore[operator]
+        return delta <= self.abs
+
+
+def is_datetime_sequence(value: Any) -> bool:
+    """Whether value is a sequence or array of datetimes or timedeltas."""
+    # an ndarray can only exist if numpy was already imported
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(value, np.ndarray):
+        return value.dtype.kind in "mM"
+    if not isinstance(value, (list, tuple)) or not value:
+        return False
+    first = value[0]
+    if np is not None and isinstance(first, (np.datetime64, np.timedelta64)):
+        return True
+    return isinstance(first, (datetime, timedelta))
+
+
+def _as_array(values: Any) -> Any:
+    """NumPy array of values, or None if they are Python objects."""
+    np = sys.modules.get("numpy")
+    if np is None:
+        return None
+    if isinstance(values, np.ndarray):
+        return values
+    if isinstance(values[0], (np.datetime64, np.timedelta64)):
+        return np.asarray(values)
+    # converting datetime objects to an array is slower than comparing them
+    return None
+
+
+class approx_datetime_sequence(ApproxBase):
+    """Approximate comparison of sequences of datetimes or timedeltas.
+
+    NumPy datetime64/timedelta64 arrays (and sequences of their scalars) are
+    compared in a single vectorized operation, where NaT only equals NaT.
+    Lists and tuples of datetime or timedelta objects are compared in a
+    Python loop, without needing NumPy.
+    """
+
+    default_tolerance = timedelta(seconds=1)
+    expected: Sequence[Any]
+    abs: timedelta
+
+    def __init__(
+        self, expected: Sequence[Any], abs: Optional[timedelta] = None
+    ) -> None:
+        abs = self.default_tolerance if abs is None else abs
+        assert abs >= timedelta(0), f"absolute tolerance can't be negative: {abs}"
+        super().__init__(expected, abs=abs)
+        self._array = _as_array(expected)
+
+    def __repr__(self) -> str:
+        return f"approx_datetime_sequence({bounded_repr(self.expected)} ± {self.abs!r})"
+
+    def __eq__(self, actual: object) -> bool:
+        return self._first_mismatch(actual) == -1
+
+    def _repr_compare(self, other_side: Any) -> List[str]:
+        index = self._first_mismatch(other_side)
+        if index is None:
+            return ["comparison failed: shapes or types differ", f"Expected: {self}"]
+        return [
+            f"comparison failed at index {index}",
+            f"Obtained: {other_side[index]!r}",
+            f"Expected: {self.expected[index]!r} ± {self.abs!r}",
+        ]
+
+    def _first_mismatch(self, actual: Any) -> Optional[int]:
+        """Index of the first mismatch, -1 if none, None if incomparable."""
+        if self._array is not None:
+            return self._first_mismatch_array(actual)
+
+        try:
+            if len(actual) != len(self.expected):
+                return None
+            tolerance = self.abs
+            deltas = map(operator.sub, actual, self.expected)
+            for index, delta in enumerate(deltas):
+                if abs(delta) > tolerance:
+                    return index
+        except TypeError:
+            return None
+        return -1
+
+    def _first_mismatch_array(self, actual: Any) -> Optional[int]:
+        np = sys.modules["numpy"]
+        expected = self._array
+        try:
+            array = np.asarray(actual)
+            if array.dtype.kind == "O":
+                array = array.astype(expected.dtype)
+            if array.shape != expected.shape:
+                return None
+            matches = np.abs(array - expected) <= np.timedelta64(self.abs)
+        except (TypeError, ValueError):
+            return None
+        matches |= np.isnat(array) & np.isnat(expected)
+        if matches.all():
+            return -1
+        return int(np.flatnonzero(~matches)[0])
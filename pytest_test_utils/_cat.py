@@ -0,0 +1,90 @@
+import collections.abc
+import hashlib
+import os
+from typing import Any, Dict, Iterator, Optional, Union
+
+CHUNK_SIZE = 1 << 20
+
+Contents = Union[str, bytes]
+
+
+def read_contents(
+    path: "Union[str, os.PathLike[str]]",
+    binary: bool = False,
+    max_size: Optional[int] = None,
+) -> Contents:
+    """Read a file, or return its sha256 digest if it's larger than max_size."""
+    with open(path, "rb") as fobj:
+        if max_size is None:
+            data = fobj.read()
+        else:
+            data = fobj.read(max_size + 1)
+            if len(data) > max_size:
+                hasher = hashlib.sha256(data)
+                for chunk in iter(lambda: fobj.read(CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+                return f"sha256:{hasher.hexdigest()}"
+
+    if binary:
+        return data
+    text = data.decode("utf-8")
+    if "\r" in text:
+        # same as universal newlines mode used by `Path.read_text()`
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+class CatView(collections.abc.Mapping):  # type: ignore[type-arg]
+    """Lazy, read-only mapping view of a directory tree.
+
+    Directories are listed on first access, and files are read only when
+    their key is accessed or compared.
+    """
+
+    def __init__(
+        self,
+        path: "Union[str, os.PathLike[str]]",
+        binary: bool = False,
+        max_size: Optional[int] = None,
+    ) -> None:
+        self.path = os.fspath(path)
+        self.binary = binary
+        self.max_size = max_size
+        self._entries: Optional[Dict[str, bool]] = None
+
+    @property
+    def entries(self) -> Dict[str, bool]:
+        """Mapping of entry names to whether they are directories."""
+        if self._entries is None:
+            with os.scandir(self.path) as it:
+                self._entries = {entry.name: entry.is_dir() for entry in it}
+        return self._entries
+
+    def __getitem__(self, key: str) -> Union[Contents, "CatView"]:
+        is_dir = self.entries[key]
+        path = os.path.join(self.path, key)
+        if is_dir:
+            return CatView(path, binary=self.binary, max_size=self.max_size)
+        return read_contents(path, binary=self.binary, max_size=self.max_size)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, collections.abc.Mapping):
+            return NotImplemented
+        if self.entries.keys() != other.keys():
+            return False
+        return all(self[key] == other[key] for key in self.entries)
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            key: value.to_dict() if isinstance(value, CatView) else value
+            for key, value in self.items()
+        }
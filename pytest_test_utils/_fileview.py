@@ -0,0 +1,84 @@
+import mmap
+import os
+from types import TracebackType
+from typing import Iterator, Optional, Type, Union
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+def _encode(value: Union[str, bytes]) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class FileView:
+    """Read-only, memory-mapped view of a file's contents.
+
+    The file is mapped on first access, so searching it with `in`,
+    `startswith`, `endswith` or a `regex` matcher does not load it into
+    memory. str arguments are encoded as utf-8.
+    """
+
+    def __init__(self, path: "Union[str, os.PathLike[str]]") -> None:
+        self.path = os.fspath(path)
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    @property
+    def buffer(self) -> Buffer:
+        if self._mmap is not None:
+            return self._mmap
+        with open(self.path, "rb") as fobj:
+            if not os.fstat(fobj.fileno()).st_size:
+                return b""  # empty files cannot be mapped
+            self._mmap = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+        return self._mmap
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> "FileView":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def __contains__(self, sub: Union[str, bytes]) -> bool:
+        return self.find(sub) != -1
+
+    def find(self, sub: Union[str, bytes], start: int = 0) -> int:
+        return self.buffer.find(_encode(sub), start)
+
+    def startswith(self, prefix: Union[str, bytes]) -> bool:
+        prefix = _encode(prefix)
+        return self.buffer[: len(prefix)] == prefix
+
+    def endswith(self, suffix: Union[str, bytes]) -> bool:
+        suffix = _encode(suffix)
+        buffer = self.buffer
+        if len(suffix) > len(buffer):
+            return False
+        return buffer[len(buffer) - len(suffix) :] == suffix
+
+    def lines(self) -> Iterator[bytes]:
+        """Iterate over the lines of the file, keeping their line endings."""
+        buffer = self.buffer
+        start, end = 0, len(buffer)
+        while start < end:
+            pos = buffer.find(b"\n", start)
+            stop = end if pos == -1 else pos + 1
+            yield buffer[start:stop]
+            start = stop
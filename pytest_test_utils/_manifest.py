@@ -0,0 +1,234 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    import xxhash
+except ImportError:  # pragma: no cover
+    xxhash = None
+
+CHUNK_SIZE = 1 << 20
+# files modified this recently might change again without changing their
+# mtime (within the filesystem's timestamp granularity), so their digests
+# are not cached.
+RACY_NS = 2_000_000_000
+# the same, for filesystems with sub-second timestamps, which are still only
+# updated once per kernel tick
+FINE_RACY_NS = 20_000_000
+
+HASH_NAME = "xxh3_64" if xxhash is not None else "blake2b-64"
+
+StatKey = Tuple[int, int, int, int]
+AnyPath = Union[str, "os.PathLike[str]"]
+
+
+def file_digest(path: AnyPath) -> str:
+    """Fast, non-cryptographic digest of a file's contents.
+
+    Uses xxhash (the `fast` extra) if it is installed, and blake2b otherwise.
+    Digests of the two are not comparable, see `HASH_NAME`.
+    """
+    if xxhash is not None:  # pragma: no cover
+        hasher = xxhash.xxh3_64()
+    else:
+        hasher = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as fobj:
+        for chunk in iter(lambda: fobj.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    digest: str = hasher.hexdigest()
+    return digest
+
+
+def scan(root: AnyPath) -> Dict[str, os.stat_result]:
+    """Stat all files in the tree, keyed by their relative posix path."""
+    result = {}
+    stack = [("", os.fspath(root))]
+    while stack:
+        prefix, path = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                relpath = prefix + entry.name
+                if entry.is_dir():
+                    stack.append((relpath + "/", entry.path))
+                else:
+                    result[relpath] = entry.stat()
+    return result
+
+
+class _DigestCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[StatKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: StatKey) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: StatKey, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+_digests = _DigestCache(1 << 16)
+
+
+def cached_digest(path: AnyPath, st: os.stat_result, cache: bool = True) -> str:
+    """Digest of a file, cached by its (device, inode, mtime, size)."""
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    if cache:
+        value = _digests.get(key)
+        if value is not None:
+            return value
+
+    value = file_digest(path)
+    if cache and time.time_ns() - st.st_mtime_ns > RACY_NS:
+        _digests.set(key, value)
+    return value
+
+
+class ManifestEntry(NamedTuple):
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class ManifestDiff(NamedTuple):
+    added: List[str]
+    removed: List[str]
+    changed: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class Manifest(Dict[str, ManifestEntry]):
+    """Mapping of relative paths to their size, mtime and content digest."""
+
+    def diff(self, other: "Manifest") -> ManifestDiff:
+        """Paths added, removed or changed in this manifest compared to other."""
+        changed = [
+            path
+            for path in self.keys() & other.keys()
+            if self[path].size != other[path].size
+            or self[path].digest != other[path].digest
+        ]
+        return ManifestDiff(
+            added=sorted(self.keys() - other.keys()),
+            removed=sorted(other.keys() - self.keys()),
+            changed=sorted(changed),
+        )
+
+
+def build_manifest(
+    root: AnyPath, jobs: Optional[int] = None, cache: bool = True
+) -> Manifest:
+    stats = scan(root)
+
+    def digest(item: Tuple[str, os.stat_result]) -> str:
+        relpath, st = item
+        return cached_digest(os.path.join(root, relpath), st, cache=cache)
+
+    if stats:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            digests = list(executor.map(digest, stats.items()))
+    else:
+        digests = []
+
+    return Manifest(
+        (relpath, ManifestEntry(st.st_size, st.st_mtime_ns, value))
+        for (relpath, st), value in zip(stats.items(), digests)
+    )
+
+
+def _is_racy(st: os.stat_result, now_ns: int) -> bool:
+    coarse = st.st_mtime_ns % 1_000_000_000 == 0
+    return now_ns - st.st_mtime_ns < (RACY_NS if coarse else FINE_RACY_NS)
+
+
+class ChangeSet(Dict[str, List[str]]):
+    """Relative paths of files added, removed, modified and unchanged, keyed
+    by kind, so that it can be compared to a dict or `M.dict(...)`."""
+
+    def __init__(
+        self,
+        added: Iterable[str] = (),
+        removed: Iterable[str] = (),
+        modified: Iterable[str] = (),
+        unchanged: Iterable[str] = (),
+    ) -> None:
+        super().__init__(
+            added=sorted(added),
+            removed=sorted(removed),
+            modified=sorted(modified),
+            unchanged=sorted(unchanged),
+        )
+
+    @property
+    def added(self) -> List[str]:
+        return self["added"]
+
+    @property
+    def removed(self) -> List[str]:
+        return self["removed"]
+
+    @property
+    def modified(self) -> List[str]:
+        return self["modified"]
+
+    @property
+    def unchanged(self) -> List[str]:
+        return self["unchanged"]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+
+class Snapshot:
+    """Stat data of all files in a tree, to find out what changed since.
+
+    Files are compared by (inode, size, mtime). Only files modified so
+    recently that a change might not show up in their stat data are hashed,
+    both when taking the snapshot and when comparing to it.
+    """
+
+    def __init__(self, root: AnyPath) -> None:
+        self.root = os.fspath(root)
+        now_ns = time.time_ns()
+        stats = scan(root)
+        self.keys = {
+            relpath: (st.st_ino, st.st_size, st.st_mtime_ns)
+            for relpath, st in stats.items()
+        }
+        self.digests = {
+            relpath: file_digest(os.path.join(self.root, relpath))
+            for relpath, st in stats.items()
+            if _is_racy(st, now_ns)
+        }
+
+    def changes(self) -> ChangeSet:
+        added, modified, unchanged = [], [], []
+        stats = scan(self.root)
+        for relpath, st in stats.items():
+            key = self.keys.get(relpath)
+            if key is None:
+                added.append(relpath)
+            elif key != (st.st_ino, st.st_size, st.st_mtime_ns):
+                modified.append(relpath)
+            elif relpath in self.digests and self.digests[relpath] != file_digest(
+                os.path.join(self.root, relpath)
+            ):
+                modified.append(relpath)
+            else:
+                unchanged.append(relpath)
+        removed = self.keys.keys() - stats.keys()
+        return ChangeSet(added, removed, modified, unchanged)
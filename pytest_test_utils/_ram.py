@@ -0,0 +1,15 @@
+import os
+from typing import Optional
+
+RAM_ROOT = "/dev/shm"  # noqa: S108
+# fraction of the RAM-backed filesystem that is always left free
+RAM_HEADROOM = 0.1
+
+
+def ram_free() -> Optional[int]:
+    """Usable free space on the RAM-backed filesystem, None if unavailable."""
+    if not hasattr(os, "statvfs") or not os.access(RAM_ROOT, os.W_OK):
+        return None
+    st = os.statvfs(RAM_ROOT)
+    headroom = int(st.f_blocks * st.f_frsize * RAM_HEADROOM)
+    return max(st.f_bavail * st.f_frsize - headroom, 0)
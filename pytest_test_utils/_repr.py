@@ -0,0 +1,107 @@
+from typing import Any, Iterable, List, Optional, Tuple
+
+DEFAULT_MAX_CHARS = 2_000
+DEFAULT_MAX_DEPTH = 6
+ELLIPSIS = "..."
+
+max_chars = DEFAULT_MAX_CHARS
+max_depth = DEFAULT_MAX_DEPTH
+
+
+def configure(
+    chars: Optional[int] = None, depth: Optional[int] = None
+) -> Tuple[int, int]:
+    """Set the repr budget of matchers, returning the previous one."""
+    global max_chars, max_depth
+    previous = max_chars, max_depth
+    if chars is not None:
+        max_chars = chars
+    if depth is not None:
+        max_depth = depth
+    return previous
+
+
+class _Exhausted(Exception):
+    pass
+
+
+class ReprWriter:
+    """Builds a repr piece by piece, and stops once its budget is used up.
+
+    Objects with a `_write_repr(writer)` method, and builtin containers, are
+    written incrementally; anything nested deeper than `max_depth` is elided.
+    """
+
+    def __init__(self, chars: int, depth: int) -> None:
+        self.parts: List[str] = []
+        self.remaining = chars
+        self.depth = depth
+
+    def write(self, text: str) -> None:
+        if len(text) > self.remaining:
+            self.parts.append(text[: self.remaining])
+            raise _Exhausted
+        self.parts.append(text)
+        self.remaining -= len(text)
+
+    def obj(self, value: Any) -> None:
+        write_repr = getattr(type(value), "_write_repr", None)
+        cls = type(value)
+        if write_repr is None and cls not in (list, tuple, set, frozenset, dict):
+            if cls in (str, bytes):
+                # don't repr more of a huge string than can be written
+                value = value[: self.remaining + 1]
+            self.write(repr(value))
+            return
+
+        if self.depth <= 0:
+            self.write(ELLIPSIS)
+            return
+        self.depth -= 1
+        if write_repr is not None:
+            write_repr(value, self)
+        elif cls is dict:
+            self.write("{")
+            for i, (key, item) in enumerate(value.items()):
+                if i:
+                    self.write(", ")
+                self.obj(key)
+                self.write(": ")
+                self.obj(item)
+            self.write("}")
+        elif cls is list:
+            self.items("[", value, "]")
+        elif cls is tuple:
+            self.items("(", value, ",)" if len(value) == 1 else ")")
+        elif not value:
+            self.write(f"{cls.__name__}()")
+        elif cls is set:
+            self.items("{", value, "}")
+        else:
+            self.items("frozenset({", value, "})")
+        self.depth += 1
+
+    def items(self, start: str, values: Iterable[Any], end: str) -> None:
+        self.write(start)
+        for i, value in enumerate(values):
+            if i:
+                self.write(", ")
+            self.obj(value)
+        self.write(end)
+
+    def kwargs(self, start: str, values: Iterable[Tuple[Any, Any]], end: str) -> None:
+        self.write(start)
+        for i, (name, value) in enumerate(values):
+            self.write(f", {name}=" if i else f"{name}=")
+            self.obj(value)
+        self.write(end)
+
+
+def bounded_repr(obj: Any) -> str:
+    """Repr of `obj`, cut short with an ellipsis once it's over budget."""
+    writer = ReprWriter(max_chars, max_depth)
+    try:
+        writer.obj(obj)
+    except _Exhausted:
+        return "".join(writer.parts) + ELLIPSIS
+    return "".join(writer.parts)
@@ -0,0 +1,200 @@
+import difflib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NoReturn, Optional, Tuple, Union
+
+from ._manifest import (
+    HASH_NAME,
+    Manifest,
+    ManifestDiff,
+    ManifestEntry,
+    _is_racy,
+    build_manifest,
+    cached_digest,
+    scan,
+)
+
+INDEX_SUFFIX = ".index.json"
+
+# relpath -> (size, mtime_ns, inode, digest)
+Index = Dict[str, Tuple[int, int, int, str]]
+
+
+def load_index(path: Path) -> Index:
+    """Stats and digests of golden files, or {} if missing or outdated."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("hash") != HASH_NAME:
+            return {}
+        return {
+            relpath: (size, mtime_ns, ino, digest)
+            for relpath, (size, mtime_ns, ino, digest) in data["files"].items()
+        }
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+def save_index(path: Path, index: Index) -> None:
+    data = {"hash": HASH_NAME, "files": dict(sorted(index.items()))}
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, indent=1) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _index_entry(st: os.stat_result, digest: str) -> Tuple[int, int, int, str]:
+    # files modified this recently might change again without changing their
+    # mtime, so they are always re-hashed
+    mtime_ns = -1 if _is_racy(st, time.time_ns()) else st.st_mtime_ns
+    return (st.st_size, mtime_ns, st.st_ino, digest)
+
+
+def golden_index(root: Path, index: Index) -> Index:
+    """Index of a golden tree, trusting `index` for files with unchanged stats.
+
+    Golden files are only read if they are missing from the index, or if
+    their size, mtime or inode does not match it (e.g. after being edited by
+    hand, or checked out again).
+    """
+    result = {}
+    for relpath, st in scan(root).items():
+        size, mtime_ns, ino, digest = index.get(relpath, (-1, -1, -1, ""))
+        if (size, mtime_ns, ino) != (st.st_size, st.st_mtime_ns, st.st_ino):
+            digest = cached_digest(root / relpath, st)
+        result[relpath] = _index_entry(st, digest)
+    return result
+
+
+def _to_manifest(index: Index) -> Manifest:
+    return Manifest(
+        {
+            relpath: ManifestEntry(size, mtime_ns, digest)
+            for relpath, (size, mtime_ns, _, digest) in index.items()
+        }
+    )
+
+
+def _to_index(root: Path, manifest: Manifest) -> Index:
+    """Index of a golden tree just copied from a tree with this manifest."""
+    return {
+        relpath: _index_entry(st, manifest[relpath].digest)
+        for relpath, st in scan(root).items()
+    }
+
+
+def _format_diff(diff: ManifestDiff) -> List[str]:
+    lines = []
+    for kind in ("added", "removed", "changed"):
+        paths = getattr(diff, kind)
+        if paths:
+            lines.append(f"  {kind} ({len(paths)}): {', '.join(paths[:10])}")
+            if len(paths) > 10:
+                lines[-1] += ", ..."
+    return lines
+
+
+def _prune(root: Path, relpath: str) -> None:
+    """Remove the file and its parent directories, as long as they're empty."""
+    path = root / relpath
+    path.unlink()
+    for parent in path.parents:
+        if parent == root:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+
+
+class GoldenSnapshot:
+    """Compares directory trees and values to golden copies stored in `root`.
+
+    Trees are stored as a copy, along with an index of the size, mtime,
+    inode and digest of each file, so that identical files are skipped
+    without reading the golden side. Values are stored as JSON.
+
+    With `update`, mismatching snapshots are updated instead of failing, and
+    only the files that differ are rewritten.
+    """
+
+    def __init__(
+        self, root: Union[str, "os.PathLike[str]"], name: str, update: bool = False
+    ) -> None:
+        self.root = Path(root)
+        self.name = name
+        self.update = update
+        self.updated: List[Path] = []
+        self._count = 0
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({os.fspath(self.root / self.name)!r})"
+
+    def _path(self, name: Optional[str]) -> Path:
+        if name is not None:
+            return self.root / f"{self.name}.{name}"
+        count, self._count = self._count, self._count + 1
+        return self.root / (f"{self.name}-{count}" if count else self.name)
+
+    def assert_match(self, value: Any, name: Optional[str] = None) -> None:
+        """Compare a directory (any path-like) or a JSON-serializable value
+        to its snapshot.
+
+        Unnamed snapshots are numbered in the order they are taken in a test.
+        """
+        path = self._path(name)
+        if isinstance(value, os.PathLike):
+            self._match_tree(Path(value), path)
+        else:
+            self._match_value(value, path.with_name(f"{path.name}.json"))
+
+    def _fail(self, message: str, lines: List[str]) -> NoReturn:
+        hint = "run with --snapshot-update to update it"
+        raise AssertionError("\n".join([message, *lines, hint]))
+
+    def _match_value(self, value: Any, path: Path) -> None:
+        text = json.dumps(value, indent=2, sort_keys=True, ensure_ascii=False) + "\n"
+        try:
+            golden = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            golden = None
+        if golden == text:
+            return
+        if self.update:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+            self.updated.append(path)
+        elif golden is None:
+            self._fail(f"snapshot {path} does not exist", [])
+        else:
+            diff = difflib.unified_diff(
+                golden.splitlines(), text.splitlines(), "snapshot", "value", lineterm=""
+            )
+            self._fail(f"value does not match snapshot {path}:", list(diff))
+
+    def _match_tree(self, tree: Path, golden: Path) -> None:
+        index_path = golden.with_name(f"{golden.name}{INDEX_SUFFIX}")
+        index = load_index(index_path)
+        current = golden_index(golden, index) if golden.is_dir() else None
+        expected = _to_manifest(current) if current is not None else None
+        actual = build_manifest(tree)
+        diff = actual.diff(expected or Manifest())
+        if current is not None and not diff:
+            if self.update and index != current:
+                save_index(index_path, current)
+            return
+        if not self.update:
+            if expected is None:
+                self._fail(f"snapshot {golden} does not exist", [])
+            self._fail(f"{tree} does not match snapshot {golden}:", _format_diff(diff))
+
+        for relpath in (*diff.added, *diff.changed):
+            dst = golden / relpath
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(tree / relpath, dst)
+        for relpath in diff.removed:
+            _prune(golden, relpath)
+        golden.mkdir(parents=True, exist_ok=True)
+        save_index(index_path, _to_index(golden, actual))
+        self.updated.append(golden)
@@ -1,37 +1,101 @@
 import collections.abc
+import functools
+import operator
 import re
-from datetime import datetime
+import reprlib
+from datetime import datetime, timedelta
+from itertools import compress, repeat
+from mmap import mmap
 from typing import (
     TYPE_CHECKING,
     Any,
     AnyStr,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
     Pattern,
+    Set,
     Tuple,
     Union,
 )
 
+from ._fileview import FileView
+from ._repr import ReprWriter, bounded_repr
+
 if TYPE_CHECKING:
     from _pytest.python_api import ApproxBase
 
+_reprlib = reprlib.Repr()
+_reprlib.maxstring = _reprlib.maxother = 80
+
+
+def _short_repr(obj: Any) -> str:
+    return _reprlib.repr(obj)
+
+
+_REGEX_MODES = ("search", "match", "fullmatch")
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(pattern: Any, flags: int) -> Pattern[Any]:
+    return re.compile(pattern, flags)
+
+
+@functools.lru_cache(maxsize=1024)
+def _counterpart(compiled: Pattern[Any]) -> Pattern[Any]:
+    """Compile a bytes version of a str pattern, or vice versa."""
+    if isinstance(compiled.pattern, str):
+        return re.compile(
+            compiled.pattern.encode("utf-8"), compiled.flags & ~re.UNICODE
+        )
+    return re.compile(
+        compiled.pattern.decode("utf-8", "surrogateescape"),
+        (compiled.flags & ~re.LOCALE) | re.ASCII,
+    )
+
 
 class regex:
-    """Special class to eq by matching regex"""
+    """Special class to eq by matching regex
+
+    `mode` is one of "search" (default), "match" or "fullmatch". Patterns
+    are compiled once and cached; a str pattern also matches bytes values
+    (and vice versa), encoded as utf-8.
+
+    It can also be compared against a `FileView` or any other bytes-like
+    buffer (e.g. an mmap), which is searched in place.
+    """
 
     def __init__(
         self,
         pattern: Union[AnyStr, Pattern[AnyStr]],
         flags: Union[int, re.RegexFlag] = 0,
+        mode: str = "search",
     ) -> None:
-        self._regex: Pattern[AnyStr] = re.compile(pattern, flags)  # type: ignore[arg-type]
+        if mode not in _REGEX_MODES:
+            raise ValueError(f"mode must be one of {_REGEX_MODES}, not {mode!r}")
+        self._regex: Pattern[AnyStr] = _compile(pattern, flags)
+        self.mode = mode
 
     def __repr__(self) -> str:
         flags = self._regex.flags & ~32  # 32 is default
         flags_repr = f", {flags}" if flags else ""
-        return f"regex(r'{self._regex.pattern!s}'{flags_repr})"
+        mode_repr = f", mode={self.mode!r}" if self.mode != "search" else ""
+        return f"regex(r'{self._regex.pattern!s}'{flags_repr}{mode_repr})"
+
+    def matches(self, value: Any) -> bool:
+        if isinstance(value, FileView):
+            value = value.buffer
+        compiled = self._regex
+        if isinstance(value, str) is not isinstance(compiled.pattern, str):
+            compiled = _counterpart(compiled)
+        return getattr(compiled, self.mode)(value) is not None
 
     def __eq__(self, other: Any) -> bool:
-        assert isinstance(other, (str, bytes))
-        return bool(self._regex.search(other))  # type: ignore[arg-type]
+        assert isinstance(other, (str, bytes, bytearray, memoryview, mmap, FileView))
+        return self.matches(other)
 
 
 class any:
@@ -46,6 +110,46 @@ class any:
         return True
 
 
+_MISSING: Any = object()
+
+
+class _Mismatch(NamedTuple):
+    # (is_attribute, name) steps from the compared object to the mismatch
+    path: Tuple[Tuple[bool, Any], ...]
+    expected: Any
+    actual: Any
+
+
+def _mismatch(is_attr: bool, name: Any, expected: Any, actual: Any) -> _Mismatch:
+    inner = getattr(expected, "mismatch", None)
+    if isinstance(inner, _Mismatch) and isinstance(
+        expected, (attrs, MatcherDict, each, prefix)
+    ):
+        return inner._replace(path=((is_attr, name), *inner.path))
+    return _Mismatch(((is_attr, name),), expected, actual)
+
+
+def _format_path(path: Tuple[Tuple[bool, Any], ...]) -> str:
+    return "".join(
+        f".{name}" if is_attr else f"[{_short_repr(name)}]" for is_attr, name in path
+    )
+
+
+def _explain(mismatch: Optional[_Mismatch]) -> List[str]:
+    if mismatch is None:
+        return []
+    lines = [f"Mismatch at {_format_path(mismatch.path)}:"]
+    if isinstance(mismatch.expected, (unordered, contains)):
+        lines.extend(f"  {line}" for line in mismatch.expected.explain())
+        return lines
+    lines.append(f"  expected: {_short_repr(mismatch.expected)}")
+    if mismatch.actual is _MISSING:
+        lines.append("  actual:   <missing>")
+    else:
+        lines.append(f"  actual:   {_short_repr(mismatch.actual)}")
+    return lines
+
+
 class MatcherDict:
     """Special class to eq by matching only presented dict keys"""
 
@@ -57,61 +161,388 @@ class MatcherDict:
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         self.d = dict(*args, **kwargs)
+        self.mismatch: Optional[_Mismatch] = None
 
     def __len__(self) -> int:
         return len(self.d)
 
     def __repr__(self) -> str:
-        inner = ", ".join(f"{k}={repr(v)}" for k, v in self.d.items())
-        return f"M.dict({inner})"
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.kwargs("M.dict(", self.d.items(), ")")
 
     def __eq__(self, other: object) -> bool:
         assert isinstance(other, collections.abc.Mapping)
-        return all(other.get(name) == v for name, v in self.d.items())
+        get = other.get
+        for name, expected in self.d.items():
+            actual = get(name, _MISSING)
+            # a missing key is compared like `other.get(name)`
+            if not (None if actual is _MISSING else actual) == expected:
+                self.mismatch = _mismatch(False, name, expected, actual)
+                return False
+        self.mismatch = None
+        return True
+
+    def explain(self) -> List[str]:
+        """Describe the first mismatch found by the last comparison."""
+        return _explain(self.mismatch)
+
+
+_UNHASHABLE = object()
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable key that compares like the value, or _UNHASHABLE."""
+    if isinstance(value, dict):
+        items = []
+        for key, item in value.items():
+            frozen = _freeze(item)
+            if frozen is _UNHASHABLE:
+                return _UNHASHABLE
+            items.append((key, frozen))
+        return (dict, frozenset(items))
+    if isinstance(value, list):
+        frozen_items = tuple(map(_freeze, value))
+        if _UNHASHABLE in frozen_items:
+            return _UNHASHABLE
+        return (list, frozen_items)
+    try:
+        hash(value)
+    except TypeError:
+        return _UNHASHABLE
+    return value
+
+
+def _equals(actual: Any, expected: Any) -> bool:
+    try:
+        return bool(actual == expected)
+    except AssertionError:
+        # matchers like regex and M.dict assert the type of what they're
+        # compared to, which is just a mismatch here
+        return False
+
+
+class _Matching:
+    """Incremental maximum matching of actual items to the expected items.
+
+    Hashable expected items (and lists and dicts of them) are grouped into
+    buckets by value; the rest, e.g. matchers, are compared with ==. Each
+    actual item is matched as it is added, by searching for an augmenting
+    path, so that an item taken by a bucket or by a loose matcher like
+    `M.any` is handed over when a stricter matcher needs it.
+
+    An actual item that cannot be matched when it is added can't be matched
+    later either, so it is not kept. Matched items are only kept if they
+    equal more than one expected bucket or matcher."""
+
+    def __init__(self, items: Iterable[Any]) -> None:
+        self._buckets: Dict[Any, int] = {}  # frozen key -> node
+        self._matchers: List[int] = []  # nodes of unhashable items
+        self._items: List[List[Any]] = []  # expected items of each node
+        for item in items:
+            key = _freeze(item)
+            node = None if key is _UNHASHABLE else self._buckets.get(key)
+            if node is None:
+                node = len(self._items)
+                self._items.append([])
+                if key is _UNHASHABLE:
+                    self._matchers.append(node)
+                else:
+                    self._buckets[key] = node
+            self._items[node].append(item)
+        self._count = [0] * len(self._items)
+        # matched actual items that equal other nodes too, and their edges
+        self._flexible: List[Set[int]] = [set() for _ in self._items]
+        self._owner: Dict[int, int] = {}
+        self._edges: Dict[int, List[int]] = {}
+        # full nodes from which no augmenting path exists; since paths never
+        # pass through them, that stays true as more items are added
+        self._closed: Set[int] = set()
+        self._added = 0
+        self.unmatched = sum(map(len, self._items))
+
+    def _neighbors(self, item: Any) -> List[int]:
+        key = _freeze(item)
+        if key is _UNHASHABLE:
+            nodes = [
+                node for node in self._buckets.values() if item == self._items[node][0]
+            ]
+        else:
+            node = self._buckets.get(key)
+            nodes = [] if node is None else [node]
+        nodes.extend(
+            node for node in self._matchers if _equals(item, self._items[node][0])
+        )
+        return nodes
+
+    def _assign(self, index: int, node: int, edges: List[int]) -> None:
+        if len(edges) > 1:
+            self._owner[index] = node
+            self._edges[index] = edges
+            self._flexible[node].add(index)
+
+    def add(self, item: Any) -> bool:
+        """Match the item, returning False if it cannot be matched."""
+        index, self._added = self._added, self._added + 1
+        edges = self._neighbors(item)
+        if not edges or not self.unmatched:
+            return False
+
+        via: Dict[int, int] = {}  # node -> actual index reaching it
+        queue = collections.deque([index])
+        seen = {index}
+        while queue:
+            current = queue.popleft()
+            for node in edges if current == index else self._edges[current]:
+                if node in via or node in self._closed:
+                    continue
+                via[node] = current
+                if self._count[node] < len(self._items[node]):
+                    self._count[node] += 1
+                    self.unmatched -= 1
+                    self._flip(node, via, index, edges)
+                    return True
+                for other in self._flexible[node] - seen:
+                    seen.add(other)
+                    queue.append(other)
+        self._closed.update(via)
+        return False
+
+    def _flip(
+        self, node: int, via: Dict[int, int], index: int, edges: List[int]
+    ) -> None:
+        # move each item on the path to the next node, back to the new item
+        while True:
+            current = via[node]
+            if current == index:
+                self._assign(index, node, edges)
+                return
+            previous = self._owner[current]
+            self._flexible[previous].discard(current)
+            self._assign(current, node, self._edges[current])
+            node = previous
+
+    def missing(self) -> List[Any]:
+        """Expected items left unmatched, hashable ones first."""
+        return [
+            item
+            for node in (*self._buckets.values(), *self._matchers)
+            for item in self._items[node][self._count[node] :]
+        ]
 
 
 class unordered:
     """Compare list contents, but do not care about ordering.
 
-    (E.g. sort lists first, then compare.)
-    If you care about ordering, then just compare lists directly."""
+    Hashable items (and lists and dicts of them) are counted in O(n);
+    only the items that could equal other matchers (or unhashable items) are
+    compared pairwise. The items that were missing or extra in the last
+    comparison are kept in `missing` and `extra`. If you care about
+    ordering, then just compare lists directly."""
 
     def __init__(self, *items: Any) -> None:
         self.items = items
+        self.missing: List[Any] = []
+        self.extra: List[Any] = []
 
     def __repr__(self) -> str:
-        inner = ", ".join(map(repr, self.items))
-        return f"unordered({inner})"
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.items("unordered(", self.items, ")")
 
     def __eq__(self, other: object) -> bool:
         assert isinstance(other, collections.abc.Iterable)
-        return sorted(self.items) == sorted(other)
+        matching = _Matching(self.items)
+        self.extra = [item for item in other if not matching.add(item)]
+        self.missing = matching.missing()
+        return not self.missing and not self.extra
+
+    def explain(self) -> List[str]:
+        """Describe the missing and extra items from the last comparison."""
+        return _explain_items(("Missing", self.missing), ("Extra", self.extra))
+
+
+def _explain_items(*groups: Tuple[str, List[Any]]) -> List[str]:
+    lines = []
+    for title, items in groups:
+        if items:
+            lines.append(f"{title} items ({len(items)}):")
+            lines.extend(f"  {_short_repr(item)}" for item in items[:10])
+            if len(items) > 10:
+                lines.append(f"  ... and {len(items) - 10} more")
+    return lines
+
+
+class each:
+    """Equals to any iterable whose items all equal `pattern`.
+
+    Iterators are consumed in one pass, up to the first mismatching item,
+    which is kept in `mismatch`."""
+
+    def __init__(self, pattern: Any) -> None:
+        self.pattern = pattern
+        self.mismatch: Optional[_Mismatch] = None
+
+    def __repr__(self) -> str:
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.items("each(", [self.pattern], ")")
+
+    def __eq__(self, other: object) -> bool:
+        assert isinstance(other, collections.abc.Iterable)
+        pattern = self.pattern
+        for index, actual in enumerate(other):
+            if not actual == pattern:
+                self.mismatch = _mismatch(False, index, pattern, actual)
+                return False
+        self.mismatch = None
+        return True
+
+    def explain(self) -> List[str]:
+        """Describe the first mismatch found by the last comparison."""
+        return _explain(self.mismatch)
+
+
+class prefix:
+    """Equals to any iterable that starts with the items, in order.
+
+    Only as many items as were given are taken from iterators. The first
+    mismatching item is kept in `mismatch`."""
+
+    def __init__(self, *items: Any) -> None:
+        self.items = items
+        self.mismatch: Optional[_Mismatch] = None
+
+    def __repr__(self) -> str:
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.items("prefix(", self.items, ")")
+
+    def __eq__(self, other: object) -> bool:
+        assert isinstance(other, collections.abc.Iterable)
+        index = 0
+        # zip() stops at the end of the items without taking one more
+        for index, (expected, actual) in enumerate(zip(self.items, other), 1):
+            if not actual == expected:
+                self.mismatch = _mismatch(False, index - 1, expected, actual)
+                return False
+        if index < len(self.items):
+            self.mismatch = _mismatch(False, index, self.items[index], _MISSING)
+            return False
+        self.mismatch = None
+        return True
+
+    def explain(self) -> List[str]:
+        """Describe the first mismatch found by the last comparison."""
+        return _explain(self.mismatch)
+
+
+class contains:
+    """Equals to any iterable that contains all of the items, in any order.
+
+    Items are matched like in `unordered`, keeping only the matched items.
+    Iterators are consumed in one pass, and only until all of the items
+    have been found.
+    The items that were not found in the last comparison are kept in
+    `missing`."""
+
+    def __init__(self, *items: Any) -> None:
+        self.items = items
+        self.missing: List[Any] = []
+
+    def __repr__(self) -> str:
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.items("contains(", self.items, ")")
+
+    def __eq__(self, other: object) -> bool:
+        assert isinstance(other, collections.abc.Iterable)
+        matching = _Matching(self.items)
+        if matching.unmatched:
+            for item in other:
+                # stop without taking another item from an iterator
+                if matching.add(item) and not matching.unmatched:
+                    break
+        self.missing = matching.missing()
+        return not self.missing
+
+    def explain(self) -> List[str]:
+        """Describe the items that were not found in the last comparison."""
+        return _explain_items(("Missing", self.missing))
 
 
 class attrs:
     def __init__(self, **attribs: Any) -> None:
         self.attribs = attribs
+        self.mismatch: Optional[_Mismatch] = None
 
     def __repr__(self) -> str:
-        inner = ", ".join(f"{k}={repr(v)}" for k, v in self.attribs.items())
-        return f"attrs({inner})"
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.kwargs("attrs(", self.attribs.items(), ")")
 
     def __eq__(self, other: Any) -> bool:
         # Unforturnately this doesn't work with classes with slots
         # self.__class__ = other.__class__
-        return all(getattr(other, name) == v for name, v in self.attribs.items())
+        for name, expected in self.attribs.items():
+            actual = getattr(other, name)
+            if not actual == expected:
+                self.mismatch = _mismatch(True, name, expected, actual)
+                return False
+        self.mismatch = None
+        return True
+
+    def explain(self) -> List[str]:
+        """Describe the first mismatch found by the last comparison."""
+        return _explain(self.mismatch)
+
+
+_SORTED_REPR_MAX_ITEMS = 100
 
 
 class any_of:
+    """Equals to any of the items.
+
+    Hashable items (and lists and dicts of them) are looked up in a set,
+    other items like matchers are compared one by one."""
+
     def __init__(self, *items: Any) -> None:
-        self.items = sorted(items)
+        self.items = list(items)
+        index = set()
+        self._fallback = []
+        for item in items:
+            key = _freeze(item)
+            if key is _UNHASHABLE:
+                self._fallback.append(item)
+            else:
+                index.add(key)
+        self._index = frozenset(index)
+        # small sets of items are shown sorted, large ones (e.g. allow-lists)
+        # as given, so that a repr only ever looks at the first few items
+        self._repr_items = self.items
+        if len(items) <= _SORTED_REPR_MAX_ITEMS:
+            try:
+                self._repr_items = sorted(items)
+            except TypeError:
+                pass
 
     def __repr__(self) -> str:
-        inner = ", ".join(map(repr, self.items))
-        return f"any_of({inner})"
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.items("any_of(", self._repr_items, ")")
 
     def __eq__(self, other: object) -> bool:
-        return other in self.items
+        key = _freeze(other)
+        if key is _UNHASHABLE:
+            return other in self.items
+        return key in self._index or other in self._fallback
 
 
 class instance_of:
@@ -130,16 +561,225 @@ class instance_of:
 
 
 def approx(expected, rel=None, abs=None, nan_ok: bool = False) -> "ApproxBase":  # type: ignore[no-untyped-def]
-    if isinstance(expected, datetime):
+    if isinstance(expected, (datetime, timedelta)):
         from ._approx import approx_datetime
 
         return approx_datetime(expected, abs=abs)
 
+    from ._approx import approx_datetime_sequence, is_datetime_sequence
+
+    if is_datetime_sequence(expected):
+        return approx_datetime_sequence(expected, abs=abs)
+
     import pytest
 
     return pytest.approx(expected, rel=rel, abs=abs, nan_ok=nan_ok)
 
 
+# checks are run cheapest first: type checks, exact equality, regex, and then
+# any other comparison
+_TYPE_CHECK, _EXACT, _REGEX, _GENERIC = range(4)
+_EXACT_TYPES = (str, bytes, int, float, bool, type(None))
+
+_Path = Tuple[Tuple[bool, str], ...]
+_Getter = Callable[[Any], Any]
+_Check = Tuple[int, _Path, Any]
+# a getter of the value at a path, the steps it takes, and what to check
+_Step = Tuple[_Getter, List[_Getter], Any]
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _is_attr_path(path: _Path) -> bool:
+    return bool(path) and all(is_attr for is_attr, _ in path)
+
+
+def _steps(path: _Path) -> List[_Getter]:
+    """C-level getters to apply in turn to get the value at the path."""
+    steps: List[_Getter] = []
+    names: List[str] = []
+    for is_attr, name in path:
+        if is_attr:
+            names.append(name)
+            continue
+        if names:
+            steps.append(operator.attrgetter(".".join(names)))
+            names = []
+        steps.append(operator.methodcaller("get", name))
+    if names:
+        steps.append(operator.attrgetter(".".join(names)))
+    return steps
+
+
+def _getter(steps: List[_Getter]) -> _Getter:
+    if not steps:
+        return _identity
+    if len(steps) == 1:
+        return steps[0]
+
+    def get(value: Any) -> Any:
+        for step in steps:
+            value = step(value)
+        return value
+
+    return get
+
+
+def _column(steps: List[_Getter], values: Iterable[Any]) -> Iterable[Any]:
+    for step in steps:
+        values = map(step, values)
+    return values
+
+
+def _plan(pattern: Any, path: _Path, checks: List[_Check]) -> None:
+    if isinstance(pattern, any):
+        return
+    if isinstance(pattern, attrs):
+        for name, value in pattern.attribs.items():
+            _plan(value, (*path, (True, name)), checks)
+    elif isinstance(pattern, MatcherDict):
+        checks.append((_TYPE_CHECK, path, collections.abc.Mapping))
+        for name, value in pattern.d.items():
+            _plan(value, (*path, (False, name)), checks)
+    elif isinstance(pattern, instance_of):
+        checks.append((_TYPE_CHECK, path, pattern.expected_type))
+    elif isinstance(pattern, regex):
+        checks.append((_REGEX, path, pattern))
+    elif type(pattern) in _EXACT_TYPES:
+        checks.append((_EXACT, path, pattern))
+    else:
+        checks.append((_GENERIC, path, pattern))
+
+
+class compiled:
+    """Matcher compiled into a flat comparison plan, for repeated comparisons.
+
+    Nested `attrs`, `M.dict`, `instance_of`, `regex` and `any` matchers are
+    flattened into type checks, exact comparisons (of strings, numbers, etc)
+    and regexes, run in that order. Exact values of attributes are all
+    fetched at once and compared as a single tuple. Other values and
+    matchers are compared with `==` as usual. Unlike `attrs`, a missing
+    attribute is a mismatch rather than an error."""
+
+    def __init__(self, pattern: Any) -> None:
+        self.pattern = pattern
+        checks: List[_Check] = []
+        _plan(pattern, (), checks)
+        checks.sort(key=lambda check: check[0])
+
+        self._types: List[_Step] = []
+        attr_names: List[str] = []
+        exact: List[Any] = []
+        self._equal: List[_Step] = []
+        self._regexes: List[_Step] = []
+        self._generic: List[_Step] = []
+        for kind, path, arg in checks:
+            steps = _steps(path)
+            if kind == _TYPE_CHECK:
+                self._types.append((_getter(steps), steps, arg))
+            elif kind == _EXACT and _is_attr_path(path):
+                attr_names.append(".".join(name for _, name in path))
+                exact.append(arg)
+            elif kind == _EXACT:
+                self._equal.append((_getter(steps), steps, arg))
+            elif kind == _REGEX:
+                # bound methods of the str and bytes versions of the pattern
+                compiled_re, other = arg._regex, _counterpart(arg._regex)
+                if not isinstance(compiled_re.pattern, str):
+                    compiled_re, other = other, compiled_re
+                searches = (getattr(compiled_re, arg.mode), getattr(other, arg.mode))
+                self._regexes.append((_getter(steps), steps, searches))
+            else:
+                self._generic.append((_getter(steps), steps, arg))
+
+        # a single C call fetches all the attributes, as a tuple if several
+        self._get_exact = operator.attrgetter(*attr_names) if attr_names else None
+        self._exact = exact[0] if len(exact) == 1 else tuple(exact)
+
+    def __repr__(self) -> str:
+        return bounded_repr(self)
+
+    def _write_repr(self, writer: ReprWriter) -> None:
+        writer.items("compiled(", [self.pattern], ")")
+
+    def __eq__(self, other: Any) -> bool:
+        try:
+            for get, _, expected_type in self._types:
+                if not isinstance(get(other), expected_type):
+                    return False
+            # compared (element-wise) as `expected == actual`, like matchers
+            get_exact = self._get_exact
+            if get_exact is not None and not self._exact == get_exact(other):
+                return False
+            for get, _, expected in self._equal:
+                if not expected == get(other):
+                    return False
+            for get, _, (search_str, search_bytes) in self._regexes:
+                value = get(other)
+                if isinstance(value, str):
+                    if search_str(value) is None:
+                        return False
+                elif not isinstance(value, bytes) or search_bytes(value) is None:
+                    return False
+            for get, _, expected in self._generic:
+                if not expected == get(other):
+                    return False
+        except AttributeError:
+            return False
+        return True
+
+    def match_all(self, candidates: Iterable[Any]) -> List[bool]:
+        """Compare each of the candidates, returning a list of the results.
+
+        Each step of the plan is run over all the candidates still matching,
+        rather than running the whole plan for one candidate at a time.
+        """
+        candidates = list(candidates)
+        try:
+            indices = self._match_columns(candidates)
+        except AttributeError:  # some candidate is missing an attribute
+            eq = self.__eq__
+            return [eq(candidate) for candidate in candidates]
+        result = [False] * len(candidates)
+        for index in indices:
+            result[index] = True
+        return result
+
+    def _match_columns(self, candidates: List[Any]) -> List[int]:
+        indices = list(range(len(candidates)))
+
+        def keep(selectors: Iterable[Any]) -> None:
+            nonlocal indices, candidates
+            selected = list(selectors)
+            indices = list(compress(indices, selected))
+            candidates = list(compress(candidates, selected))
+
+        for _, steps, expected_type in self._types:
+            keep(map(isinstance, _column(steps, candidates), repeat(expected_type)))
+        if self._get_exact is not None:
+            keep(
+                map(operator.eq, repeat(self._exact), map(self._get_exact, candidates))
+            )
+        for _, steps, expected in self._equal:
+            keep(map(operator.eq, repeat(expected), _column(steps, candidates)))
+        for _, steps, (search_str, search_bytes) in self._regexes:
+            values = list(_column(steps, candidates))
+            if all(map(isinstance, values, repeat(str))):
+                keep(map(operator.is_not, map(search_str, values), repeat(None)))
+            else:
+                keep(
+                    isinstance(value, (str, bytes))
+                    and (search_str if isinstance(value, str) else search_bytes)(value)
+                    is not None
+                    for value in values
+                )
+        for _, steps, expected in self._generic:
+            keep(map(operator.eq, repeat(expected), _column(steps, candidates)))
+        return indices
+
+
 class Matcher(attrs):
     """Special class to eq by existing attrs.
     The purpose is to simplify asserts containing objects, i.e.:
@@ -164,8 +804,9 @@ class Matcher(attrs):
     def regex(
         pattern: Union[AnyStr, Pattern[AnyStr]],
         flags: Union[int, re.RegexFlag] = 0,
+        mode: str = "search",
     ) -> regex:
-        return regex(pattern, flags=flags)
+        return regex(pattern, flags=flags, mode=mode)
 
     re = regex
 
@@ -173,6 +814,18 @@ class Matcher(attrs):
     def unordered(*items: Any) -> unordered:
         return unordered(*items)
 
+    @staticmethod
+    def each(pattern: Any) -> each:
+        return each(pattern)
+
+    @staticmethod
+    def contains(*items: Any) -> contains:
+        return contains(*items)
+
+    @staticmethod
+    def prefix(*items: Any) -> prefix:
+        return prefix(*items)
+
     @staticmethod
     def any_of(*items: Any) -> any_of:
         return any_of(*items)
@@ -181,6 +834,10 @@ class Matcher(attrs):
     def instance_of(expected_type: Union[Any, Tuple[Any, ...]]) -> instance_of:
         return instance_of(expected_type)
 
+    @staticmethod
+    def compile(pattern: Any) -> compiled:
+        return compiled(pattern)
+
     @staticmethod
     def approx(expected, rel=None, abs=None, nan_ok: bool = False) -> "ApproxBase":  # type: ignore[no-untyped-def]
         return approx(expected, rel=rel, abs=abs, nan_ok=nan_ok)
@@ -0,0 +1,201 @@
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from time import perf_counter, process_time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+PROC_IO = "/proc/self/io"
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+class Budget(NamedTuple):
+    """Limits on wall and CPU time in seconds, and peak memory and I/O in bytes.
+
+    Limits that are None are not checked.
+    """
+
+    wall: Optional[float] = None
+    cpu: Optional[float] = None
+    peak_mem: Optional[int] = None
+    io_bytes: Optional[int] = None
+
+    def exceeded(self, measurement: "Measurement") -> List[str]:
+        """Describe each limit that the measurement went over."""
+        over = []
+        for name, limit in self._asdict().items():
+            value = getattr(measurement, name)
+            if limit is not None and value is not None and value > limit:
+                over.append(
+                    f"{name} {format_value(name, value)} > {format_value(name, limit)}"
+                )
+        return over
+
+
+class Measurement:
+    """Wall and CPU time in seconds, and peak memory and I/O in bytes.
+
+    `peak_mem` is the peak of memory allocated by Python while it was traced,
+    and None if it was not. `io_bytes` is the number of bytes read and written
+    by the process (including reads from the page cache), and None where
+    /proc/self/io is not available. Filled in when the measured block exits.
+    """
+
+    __slots__ = ("wall", "cpu", "peak_mem", "io_bytes")
+
+    def __init__(
+        self,
+        wall: float = 0.0,
+        cpu: float = 0.0,
+        peak_mem: Optional[int] = None,
+        io_bytes: Optional[int] = None,
+    ) -> None:
+        self.wall = wall
+        self.cpu = cpu
+        self.peak_mem = peak_mem
+        self.io_bytes = io_bytes
+
+    def __repr__(self) -> str:
+        args = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({args})"
+
+    def asdict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def format(self) -> str:
+        return ", ".join(
+            f"{name} {format_value(name, value)}"
+            for name, value in self.asdict().items()
+            if value is not None
+        )
+
+
+def format_value(name: str, value: float) -> str:
+    if name in ("wall", "cpu"):
+        if value >= 1:
+            return f"{value:.2f}s"
+        if value >= 1e-3:
+            return f"{value * 1e3:.2f}ms"
+        return f"{value * 1e6:.2f}us"
+    for unit in ("B", "KiB", "MiB"):
+        if abs(value) < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}GiB"
+
+
+def _read_io() -> Optional[Tuple[int, int]]:
+    """Bytes read and written by this process so far, if known, and the size
+    of this read of /proc/self/io, which is only counted by the next one."""
+    try:
+        with open(PROC_IO, encoding="ascii") as fobj:
+            text = fobj.read()
+    except OSError:
+        return None
+    counters = dict(line.split(": ", 1) for line in text.splitlines() if ": " in line)
+    return int(counters["rchar"]) + int(counters["wchar"]), len(text)
+
+
+# peaks of the enclosing measurements, which tracemalloc.reset_peak() loses
+_peaks: List[int] = []
+
+
+@contextmanager
+def _tracing() -> Iterator[Tuple[int, int]]:
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    current, peak = tracemalloc.get_traced_memory()
+    _peaks[:] = [max(value, peak) for value in _peaks]
+    if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+        tracemalloc.reset_peak()
+    _peaks.append(current)
+    index = len(_peaks) - 1
+    try:
+        yield current, index
+    finally:
+        del _peaks[index:]
+        if started:
+            tracemalloc.stop()
+
+
+@contextmanager
+def measure(memory: bool = False) -> Iterator[Measurement]:
+    """Measure the block, yielding a `Measurement` filled in on exit.
+
+    With `memory`, allocations are traced with tracemalloc, which makes the
+    block noticeably slower.
+    """
+    result = Measurement()
+    io_start = _read_io()
+    with _tracing() if memory else nullcontext() as tracing:
+        cpu_start = process_time()
+        wall_start = perf_counter()
+        yield result
+        result.wall = perf_counter() - wall_start
+        result.cpu = process_time() - cpu_start
+        if tracing is not None:
+            start, index = tracing
+            peak = max(_peaks[index], tracemalloc.get_traced_memory()[1])
+            result.peak_mem = max(peak - start, 0)
+    io_end = _read_io()
+    if io_start is not None and io_end is not None:
+        result.io_bytes = io_end[0] - sum(io_start)
+
+
+class PerfRecord(NamedTuple):
+    """A measurement of a test, or of a block in it, with its budget."""
+
+    name: Optional[str]  # None for the whole test
+    measurement: Measurement
+    budget: Budget
+
+    @property
+    def exceeded(self) -> List[str]:
+        return self.budget.exceeded(self.measurement)
+
+    def asdict(self) -> Dict[str, Any]:
+        """A JSON-serializable form, which `from_dict` reads back."""
+        return {
+            "name": self.name,
+            **self.measurement.asdict(),
+            "budget": self.budget._asdict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PerfRecord":
+        measurement = Measurement(*(data[name] for name in Measurement.__slots__))
+        return cls(data["name"], measurement, Budget(**data["budget"]))
+
+
+class Perf:
+    """Measures blocks inside a test against a budget; see `measure`."""
+
+    def __init__(self) -> None:
+        self.records: List[PerfRecord] = []
+
+    @contextmanager
+    def measure(
+        self,
+        name: str = "block",
+        *,
+        wall: Optional[float] = None,
+        cpu: Optional[float] = None,
+        peak_mem: Optional[int] = None,
+        io_bytes: Optional[int] = None,
+        memory: bool = False,
+    ) -> Iterator[Measurement]:
+        """Measure the block, and raise `BudgetExceeded` if it goes over any
+        of the given limits.
+
+        Memory is only traced with `memory`, or if `peak_mem` is given.
+        """
+        budget = Budget(wall, cpu, peak_mem, io_bytes)
+        with measure(memory=memory or peak_mem is not None) as result:
+            yield result
+        record = PerfRecord(name, result, budget)
+        self.records.append(record)
+        over = record.exceeded
+        if over:
+            raise BudgetExceeded(f"{name} is over budget: {', '.join(over)}")
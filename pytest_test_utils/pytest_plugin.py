@@ -1,28 +1,477 @@
+import json
+import os
+import re
+import sys
 from pathlib import Path
-from typing import Iterator, Type
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 
 import pytest
 
-from . import TempDirFactory, TmpDir, matchers
+from . import _repr
+from ._ram import RAM_ROOT, ram_free
+
+if TYPE_CHECKING:
+    from _pytest.terminal import TerminalReporter
+
+    from . import matchers, waiters
+    from .golden import GoldenSnapshot
+    from .perf import Perf, PerfRecord
+    from .template_cache import TemplateCache
+    from .tmp_dir import TmpDir
+    from .tmp_dir_factory import TempDirFactory
+
+# Implementation modules are only imported once a fixture or an option needs
+# them; see `test_plugin_import_is_lazy`.
+
+
+def pytest_addoption(parser: "pytest.Parser") -> None:
+    parser.addini(
+        "matcher_repr_max_chars",
+        help="truncate reprs of matchers to this many characters (0 for no limit).",
+        default=str(_repr.DEFAULT_MAX_CHARS),
+    )
+    parser.addini(
+        "matcher_repr_max_depth",
+        help="elide values nested deeper than this in reprs of matchers "
+        "(0 for no limit).",
+        default=str(_repr.DEFAULT_MAX_DEPTH),
+    )
+
+    group = parser.getgroup("pytest-test-utils")
+    group.addoption(
+        "--wait-durations",
+        type=int,
+        default=None,
+        metavar="N",
+        help="show N slowest wait_until calls (N=0 for all).",
+    )
+    group.addoption(
+        "--wait-durations-json",
+        default=None,
+        metavar="PATH",
+        help="write statistics of all wait_until calls as JSON to PATH.",
+    )
+    group.addoption(
+        "--tmp-dir-pool",
+        type=int,
+        default=0,
+        metavar="N",
+        help="pre-create N tmp_dir directories per worker in the background "
+        "(implies --tmp-dir-cleanup).",
+    )
+    group.addoption(
+        "--tmp-dir-cleanup",
+        action="store_true",
+        default=False,
+        help="remove each tmp_dir in the background once its test passes; "
+        "directories of failed tests are kept.",
+    )
+    group.addoption(
+        "--tmp-dir-ram",
+        action="store_true",
+        default=False,
+        help=f"create tmp_dir directories on a RAM-backed filesystem ({RAM_ROOT}) "
+        "when it has enough free space (implies --tmp-dir-cleanup).",
+    )
+    group.addoption(
+        "--snapshot-update",
+        action="store_true",
+        default=False,
+        help="update golden snapshots that do not match instead of failing; "
+        "only the files that differ are rewritten.",
+    )
+    group.addoption(
+        "--perf-json",
+        default=None,
+        metavar="PATH",
+        help="write the measurements of perf_budget tests and perf fixture "
+        "blocks as JSON to PATH.",
+    )
+
+
+def _relpath(path: str) -> str:
+    try:
+        relpath = os.path.relpath(path)
+    except ValueError:  # pragma: no cover
+        return path
+    return path if relpath.startswith("..") else relpath
+
+
+def _attach(report: "pytest.TestReport", name: str, values: Iterable[Any]) -> None:
+    """Send JSON-serializable values along with a report.
+
+    They are kept in an attribute of the report rather than in its
+    `user_properties` (which end up in JUnit XML), and reach the controller
+    of pytest-xdist workers all the same.
+    """
+    report.__dict__.setdefault(f"test_utils_{name}", []).extend(values)
+
+
+def _received(report: "pytest.TestReport", name: str) -> List[Any]:
+    values: List[Any] = report.__dict__.get(f"test_utils_{name}", [])
+    return values
+
+
+def _send(item: "pytest.Item", name: str, values: Iterable[Any]) -> None:
+    """Attach values to the next report of the item, e.g. from a fixture."""
+    outbox = item.__dict__.setdefault("_test_utils_outbox", {})
+    outbox.setdefault(name, []).extend(values)
+
+
+class WaitReporter:
+    """Reports the slowest wait_until calls, like --durations does for tests.
+
+    Each test's waits are sent along with its reports (see `_attach`),
+    and collected from there, so that the controller of pytest-xdist workers
+    sees all of them.
+    """
+
+    def __init__(self, count: Optional[int], json_path: Optional[str]) -> None:
+        self.count = count
+        self.json_path = json_path
+        self.pending: List["waiters.WaitRecord"] = []
+        self.records: List[Tuple[Optional[str], Dict[str, Any]]] = []
+
+    def record(self, record: "waiters.WaitRecord") -> None:
+        self.pending.append(record)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self) -> Generator[None, Any, None]:
+        outcome = yield
+        report = outcome.get_result()
+        if self.pending:
+            records = [record._asdict() for record in self.pending]
+            _attach(report, "wait_until", records)
+            self.pending.clear()
+
+    def pytest_runtest_logreport(self, report: "pytest.TestReport") -> None:
+        for record in _received(report, "wait_until"):
+            self.records.append((report.nodeid, record))
+
+    def _all_records(self) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+        # waits outside of any test, e.g. in pytest_sessionstart
+        return [*self.records, *((None, r._asdict()) for r in self.pending)]
+
+    def pytest_terminal_summary(self, terminalreporter: "TerminalReporter") -> None:
+        if self.count is None:
+            return
+        records = sorted(self._all_records(), key=lambda item: -item[1]["duration"])
+        if self.count:
+            records = records[: self.count]
+            title = f"slowest {self.count} wait_until calls"
+        else:
+            title = "slowest wait_until calls"
+
+        terminalreporter.write_sep("=", title)
+        if not records:
+            terminalreporter.write_line("no wait_until calls were made")
+        for nodeid, record in records:
+            terminalreporter.write_line(
+                f"{record['duration']:.2f}s {record['outcome']:<7} "
+                f"{record['polls']} polls (pred {record['pred_time']:.2f}s, "
+                f"sleep {record['sleep_time']:.2f}s) "
+                f"{_relpath(record['location'])} {nodeid or ''}"
+            )
+
+    def pytest_sessionfinish(self) -> None:
+        # the controller writes the records of all pytest-xdist workers
+        if not self.json_path or os.environ.get("PYTEST_XDIST_WORKER"):
+            return
+        data = [{"nodeid": nodeid, **record} for nodeid, record in self._all_records()]
+        Path(self.json_path).write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+class PerfReporter:
+    """Reports the measurements of tests with a perf_budget marker, and of
+    blocks measured with the perf fixture.
+
+    Records are sent along with the test reports (see `_attach`), and
+    collected from there, so that the controller of pytest-xdist workers sees
+    all of them.
+    """
+
+    def __init__(self, json_path: Optional[str]) -> None:
+        self.json_path = json_path
+        self.records: List[Tuple[str, "PerfRecord"]] = []
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item: "pytest.Item") -> Generator[None, Any, None]:
+        marker = item.get_closest_marker("perf_budget")
+        if marker is None:
+            yield
+            return
+
+        from .perf import Budget, PerfRecord, measure
+
+        budget = Budget(*marker.args, **marker.kwargs)
+        with measure(memory=budget.peak_mem is not None) as result:
+            yield
+        item.__dict__["_test_utils_perf"] = PerfRecord(None, result, budget)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(
+        self, item: "pytest.Item", call: "pytest.CallInfo[None]"
+    ) -> Generator[None, Any, None]:
+        outcome = yield
+        record = item.__dict__.pop("_test_utils_perf", None)
+        if call.when != "call" or record is None:
+            return
+        report = outcome.get_result()
+        _attach(report, "perf", [record.asdict()])
+        over = record.exceeded
+        if over and report.passed:
+            report.outcome = "failed"
+            report.longrepr = f"over perf budget: {', '.join(over)}"
+
+    def pytest_runtest_logreport(self, report: "pytest.TestReport") -> None:
+        from .perf import PerfRecord
+
+        for value in _received(report, "perf"):
+            self.records.append((report.nodeid, PerfRecord.from_dict(value)))
+
+    def pytest_terminal_summary(self, terminalreporter: "TerminalReporter") -> None:
+        if not self.records:
+            return
+        terminalreporter.write_sep("=", "perf measurements")
+        for nodeid, record in self.records:
+            name = nodeid if record.name is None else f"{nodeid} [{record.name}]"
+            over = record.exceeded
+            terminalreporter.write_line(
+                f"{record.measurement.format()}  {name}"
+                + (f"  OVER BUDGET: {', '.join(over)}" if over else "")
+            )
+
+    def pytest_sessionfinish(self) -> None:
+        # the controller writes the records of all pytest-xdist workers
+        if not self.json_path or os.environ.get("PYTEST_XDIST_WORKER"):
+            return
+        data = [
+            {"nodeid": nodeid, **record.asdict(), "exceeded": bool(record.exceeded)}
+            for nodeid, record in self.records
+        ]
+        Path(self.json_path).write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+class KeptDirReporter:
+    """Lists the tmp_dirs that failed tests left behind for debugging.
+
+    Paths are sent along with the teardown reports, like `PerfReporter`.
+    """
+
+    def __init__(self) -> None:
+        self.paths: List[Tuple[str, str]] = []
+
+    def pytest_runtest_logreport(self, report: "pytest.TestReport") -> None:
+        for path in _received(report, "tmp_dir"):
+            self.paths.append((report.nodeid, path))
+
+    def pytest_terminal_summary(self, terminalreporter: "TerminalReporter") -> None:
+        if not self.paths:
+            return
+        terminalreporter.write_sep("=", "tmp_dirs kept for debugging")
+        for nodeid, path in self.paths:
+            terminalreporter.write_line(f"{nodeid}: {path}")
+
+
+def pytest_report_header(config: "pytest.Config") -> Optional[str]:
+    if not config.getoption("--tmp-dir-ram"):
+        return None
+    free = ram_free()
+    if free is None:
+        return f"tmp_dir: {RAM_ROOT} is not available, using basetemp"
+    return f"tmp_dir: RAM-backed ({RAM_ROOT}, {free >> 20} MiB usable)"
+
+
+def pytest_configure(config: "pytest.Config") -> None:
+    config.addinivalue_line(
+        "markers",
+        "tmp_dir_ram(size=0): create tmp_dir on a RAM-backed filesystem if it "
+        "has room for size bytes, like --tmp-dir-ram does for all tests.",
+    )
+    config.addinivalue_line(
+        "markers",
+        "perf_budget(wall=None, cpu=None, peak_mem=None, io_bytes=None): fail "
+        "the test if it takes more seconds of wall or CPU time, or more bytes "
+        "of peak traced memory or I/O, than given.",
+    )
+    config.pluginmanager.register(
+        PerfReporter(config.getoption("--perf-json")), "perf-reporter"
+    )
+    config.pluginmanager.register(KeptDirReporter(), "kept-dir-reporter")
+
+    chars = int(config.getini("matcher_repr_max_chars")) or sys.maxsize
+    depth = int(config.getini("matcher_repr_max_depth")) or sys.maxsize
+    previous = _repr.configure(chars, depth)
+
+    def restore_repr_budget() -> None:
+        _repr.configure(*previous)
+
+    config.add_cleanup(restore_repr_budget)
+
+    count = config.getoption("--wait-durations")
+    json_path = config.getoption("--wait-durations-json")
+    if count is None and not json_path:
+        return
+
+    from . import waiters
+
+    reporter = WaitReporter(count, json_path)
+    waiters.add_listener(reporter.record)
+    config.pluginmanager.register(reporter, "wait-reporter")
+
+
+def pytest_unconfigure(config: "pytest.Config") -> None:
+    for name in ("perf-reporter", "kept-dir-reporter"):
+        plugin = config.pluginmanager.get_plugin(name)
+        if plugin is not None:
+            config.pluginmanager.unregister(plugin)
+    reporter = config.pluginmanager.get_plugin("wait-reporter")
+    if reporter is not None:
+        from . import waiters
+
+        waiters.remove_listener(reporter.record)
+        config.pluginmanager.unregister(reporter)
+
+
+def pytest_assertrepr_compare(
+    op: str, left: object, right: object
+) -> Optional[List[str]]:
+    # matchers can only be compared if they were imported
+    matchers = sys.modules.get(f"{__package__}.matchers")
+    if op != "==" or matchers is None:
+        return None
+    explained = (
+        matchers.unordered,
+        matchers.contains,
+        matchers.each,
+        matchers.prefix,
+        matchers.attrs,
+        matchers.MatcherDict,
+    )
+    for obj in (left, right):
+        if not isinstance(obj, explained):
+            continue
+        lines = obj.explain()
+        if lines:
+            summary = f"{matchers._short_repr(left)} == {matchers._short_repr(right)}"
+            return [summary, *lines]
+    return None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item: "pytest.Item") -> Generator[None, Any, None]:
+    outcome = yield
+    report = outcome.get_result()
+    item.__dict__.setdefault("_test_utils_reports", {})[report.when] = report
+    for name, values in item.__dict__.pop("_test_utils_outbox", {}).items():
+        _attach(report, name, values)
+
+
+def _passed(item: "pytest.Item") -> bool:
+    reports = item.__dict__.get("_test_utils_reports", {})
+    return "call" in reports and all(report.passed for report in reports.values())
+
+
+@pytest.fixture(scope="session")
+def tmp_dir_factory(
+    pytestconfig: "pytest.Config", tmp_path_factory: "pytest.TempPathFactory"
+) -> Iterator["TempDirFactory"]:
+    from .tmp_dir_factory import TempDirFactory
+
+    factory = TempDirFactory(
+        tmp_path_factory,
+        pool_size=pytestconfig.getoption("--tmp-dir-pool"),
+        ram=pytestconfig.getoption("--tmp-dir-ram"),
+    )
+    yield factory
+    factory.close()
 
 
 @pytest.fixture(scope="session")
-def tmp_dir_factory(tmp_path_factory: "pytest.TempPathFactory") -> TempDirFactory:
-    return TempDirFactory(tmp_path_factory)
+def template_cache(tmp_dir_factory: "TempDirFactory") -> "TemplateCache":
+    return tmp_dir_factory.template_cache()
 
 
 @pytest.fixture
-def tmp_dir(tmp_path: Path, monkeypatch: "pytest.MonkeyPatch") -> Iterator[TmpDir]:
-    tmp = TmpDir(tmp_path)
-    monkeypatch.chdir(tmp_path)
-    yield tmp
+def tmp_dir(
+    request: "pytest.FixtureRequest",
+    tmp_dir_factory: "TempDirFactory",
+    monkeypatch: "pytest.MonkeyPatch",
+) -> Iterator["TmpDir"]:
+    from .tmp_dir import TmpDir
+
+    marker = request.node.get_closest_marker("tmp_dir_ram")
+    ram = tmp_dir_factory.ram or marker is not None
+    pool = bool(tmp_dir_factory.pool_size) and (marker is None or tmp_dir_factory.ram)
+    if not (pool or ram or request.config.getoption("--tmp-dir-cleanup")):
+        tmp = TmpDir(request.getfixturevalue("tmp_path"))
+        monkeypatch.chdir(tmp)
+        yield tmp
+        return
+
+    basename = re.sub(r"\W", "_", request.node.name)[:30]
+    if pool:
+        tmp = tmp_dir_factory.acquire()
+    elif ram:
+        size = marker.kwargs.get("size", 0) if marker is not None else 0
+        tmp = tmp_dir_factory.mktemp(basename, ram=True, size=size)
+    else:
+        tmp = TmpDir(request.getfixturevalue("tmp_path"))
+    with tmp.chdir():
+        yield tmp
+    if _passed(request.node):
+        tmp_dir_factory.discard(tmp)
+        return
+    # keep the directory of a failed test around for debugging, named after
+    # the test in the basetemp, where pytest's retention policy removes it
+    if pool or ram:
+        tmp = tmp_dir_factory.keep(tmp, basename)
+    _send(request.node, "tmp_dir", [os.fspath(tmp)])
+
+
+@pytest.fixture
+def snapshot(request: "pytest.FixtureRequest") -> "GoldenSnapshot":
+    from .golden import GoldenSnapshot
+
+    path = Path(request.module.__file__)
+    return GoldenSnapshot(
+        # next to the test module, in __snapshots__/<module>/
+        path.parent / "__snapshots__" / path.stem,
+        re.sub(r"[^\w.-]", "_", request.node.name),
+        update=request.config.getoption("--snapshot-update"),
+    )
+
+
+@pytest.fixture
+def perf(request: "pytest.FixtureRequest") -> Iterator["Perf"]:
+    from .perf import Perf
+
+    perf = Perf()
+    yield perf
+    # sent along with the teardown report, see PerfReporter
+    _send(request.node, "perf", [record.asdict() for record in perf.records])
 
 
 @pytest.fixture(name="matcher")
 def matcher_fixture() -> Type["matchers.Matcher"]:
-    return matchers.Matcher
+    from .matchers import Matcher
+
+    return Matcher
 
 
 @pytest.fixture(name="M")
 def m_fixture() -> Type["matchers.Matcher"]:
-    return matchers.Matcher
+    from .matchers import Matcher
+
+    return Matcher
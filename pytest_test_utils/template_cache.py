@@ -0,0 +1,179 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from .tmp_dir import Fill, TmpDir
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+# from linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+DEFAULT_MAX_SIZE = 1 << 30
+
+
+def _update(hasher: "hashlib._Hash", struct: Mapping[Any, Any]) -> None:
+    hasher.update(b"{")
+    for name in sorted(struct, key=os.fsencode):
+        contents = struct[name]
+        encoded = os.fsencode(os.fsdecode(name))
+        hasher.update(b"%d:%s" % (len(encoded), encoded))
+        if isinstance(contents, dict):
+            _update(hasher, contents)
+            continue
+        if isinstance(contents, Fill):
+            hasher.update(b"f%d:%s" % (contents.size, contents.byte))
+            continue
+        if isinstance(contents, str):
+            data, tag = memoryview(contents.encode("utf-8")), b"s"
+        elif isinstance(contents, (bytes, bytearray, memoryview)):
+            data, tag = memoryview(contents).cast("B"), b"b"
+        else:
+            raise TypeError(f"cannot cache contents of type {type(contents)!r}")
+        hasher.update(b"%s%d:" % (tag, data.nbytes))
+        hasher.update(data)
+    hasher.update(b"}")
+
+
+def struct_key(struct: Mapping[Any, Any]) -> str:
+    """Stable hash of a `TmpDir.gen` struct, independent of key order."""
+    hasher = hashlib.sha256()
+    _update(hasher, struct)
+    return hasher.hexdigest()
+
+
+def _tree_size(root: "os.PathLike[str]") -> int:
+    return sum(
+        os.stat(os.path.join(dirpath, name)).st_size
+        for dirpath, _, filenames in os.walk(root)
+        for name in filenames
+    )
+
+
+def _reflink(src: str, dst: str) -> None:
+    if fcntl is None:  # pragma: no cover
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+class TemplateCache:
+    """Cache of trees generated by `TmpDir.gen`, keyed by the struct's hash.
+
+    The tree is built once inside `root`, and copied into the destination
+    on later calls using reflinks (copy-on-write clones) where supported,
+    falling back to plain copies. With `hardlink=True`, files are
+    hardlinked instead, so they must be treated as read-only by the tests.
+
+    Entries are evicted in least-recently-used order once their total size
+    exceeds `max_size`. Entries are published with an atomic rename, so
+    several processes (e.g. pytest-xdist workers) can share the same `root`.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, "os.PathLike[str]"],
+        max_size: int = DEFAULT_MAX_SIZE,
+        hardlink: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.max_size = max_size
+        self.hardlink = hardlink
+        self._reflink = True
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({os.fspath(self.root)!r})"
+
+    def materialize(
+        self, dest: TmpDir, struct: Dict[Any, Any], jobs: Optional[int] = None
+    ) -> None:
+        entry = self._get_or_build(struct, jobs)
+        try:
+            shutil.copytree(
+                entry / "tree", dest, dirs_exist_ok=True, copy_function=self._copy
+            )
+        except OSError:
+            # the entry could have been evicted by another process, or the
+            # destination conflicts with the tree; let gen build or raise.
+            dest.gen(struct, jobs=jobs)
+
+    def _get_or_build(self, struct: Dict[Any, Any], jobs: Optional[int]) -> Path:
+        key = struct_key(struct)
+        entry = self.root / key
+        try:
+            os.utime(entry / "size")
+        except FileNotFoundError:
+            pass
+        else:
+            return entry
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.root))
+        try:
+            tree = TmpDir(tmp / "tree")
+            tree.mkdir()
+            tree.gen(struct, jobs=jobs)
+            (tmp / "size").write_text(str(_tree_size(tree)))
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # another process published the same entry first
+                if not entry.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self._evict(keep=key)
+        return entry
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith("."):
+                continue
+            size_file = os.path.join(entry.path, "size")
+            try:
+                mtime = os.stat(size_file).st_mtime
+                with open(size_file, encoding="utf-8") as fobj:
+                    size = int(fobj.read())
+            except (OSError, ValueError):
+                continue
+            entries.append((mtime, size, entry.name))
+        return entries
+
+    def _evict(self, keep: str) -> None:
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            if key == keep:
+                continue
+            trash = self.root / f".trash-{uuid.uuid4().hex}"
+            try:
+                os.rename(self.root / key, trash)
+            except OSError:
+                continue  # already evicted by another process
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+
+    def _copy(self, src: str, dst: str) -> None:
+        if self.hardlink:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        if self._reflink:
+            try:
+                _reflink(src, dst)
+                return
+            except OSError:
+                self._reflink = False
+        shutil.copyfile(src, dst)
@@ -1,13 +1,175 @@
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterator
+from typing import Iterator, NamedTuple
+
+from ._cat import CatView, read_contents
+from ._fileview import FileView
+from ._manifest import ChangeSet, Manifest, Snapshot, build_manifest
+
+BLOCK_SIZE = 4096
+CHUNK_SIZE = 1 << 20
+# the most that copy_file_range/sendfile copy in one call on Linux
+_MAX_KERNEL_COPY = 0x7FFFF000
+
+
+class Fill(NamedTuple):
+    """Contents of a file of `size` bytes, all equal to `byte`.
+
+    Zero-filled files are created sparse, without writing any data.
+    """
+
+    size: int
+    byte: bytes = b"\0"
+
+
+def _contents_size(contents):
+    if isinstance(contents, str):
+        return len(contents.encode("utf-8"))
+    if isinstance(contents, (bytes, bytearray, memoryview)):
+        return memoryview(contents).nbytes
+    if isinstance(contents, Fill):
+        return 0 if contents.byte == b"\0" else contents.size
+    try:
+        return os.fstat(contents.fileno()).st_size - contents.tell()
+    except (AttributeError, OSError, ValueError):
+        return 0  # unknown until the chunks are consumed
+
+
+def estimate_size(struct):
+    """Rough estimate of the space used by `TmpDir.gen(struct)`, in bytes.
+
+    The size of iterables of chunks is not known in advance, so they are not
+    counted.
+    """
+    size = 0
+    for contents in struct.values():
+        if isinstance(contents, dict):
+            size += BLOCK_SIZE + estimate_size(contents)
+        else:
+            size += -(-_contents_size(contents) // BLOCK_SIZE) * BLOCK_SIZE
+    return size
+
+
+def _flatten(root, struct, dirs, files):
+    for name, contents in struct.items():
+        path = root / os.fsdecode(name)
+
+        if isinstance(contents, dict):
+            if not contents:
+                dirs.add(path)
+            else:
+                _flatten(path, contents, dirs, files)
+        else:
+            dirs.add(path.parent)
+            files.append((path, contents))
+
+
+def _mkdir(path):
+    try:
+        os.mkdir(path)
+    except FileNotFoundError:
+        os.makedirs(path, exist_ok=True)
+    except FileExistsError:
+        if not os.path.isdir(path):
+            raise
+
+
+def _copy_range(src_fd, dst_fd, offset):
+    """Copy src_fd from offset to its end into dst_fd, without reading it."""
+    end = os.fstat(src_fd).st_size
+    copy_file_range = getattr(os, "copy_file_range", None)
+    sendfile = getattr(os, "sendfile", None)
+    while offset < end:
+        count = min(end - offset, _MAX_KERNEL_COPY)
+        try:
+            if copy_file_range is not None:
+                copied = copy_file_range(src_fd, dst_fd, count, offset)
+            elif sendfile is not None:
+                copied = sendfile(dst_fd, src_fd, offset, count)
+            else:  # pragma: no cover
+                break
+        except OSError:
+            if copy_file_range is None:
+                break  # copy the rest in userspace
+            # e.g. across filesystems on older kernels
+            copy_file_range = None
+            continue
+        if not copied:
+            break
+        offset += copied
+    return offset
+
+
+def _copy_fileobj(src, dst):
+    try:
+        src_fd = src.fileno()
+        offset = src.tell()
+    except (OSError, ValueError):
+        pass
+    else:
+        dst.flush()
+        src.seek(_copy_range(src_fd, dst.fileno(), offset))
+    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def _write(path, contents):
+    if isinstance(contents, str):
+        path.write_text(contents, encoding="utf-8")
+        return
+    if isinstance(contents, bytes):
+        path.write_bytes(contents)
+        return
+
+    with open(path, "wb") as fobj:
+        if isinstance(contents, (bytearray, memoryview)):
+            # written straight from the buffer, without copying it
+            fobj.write(contents)
+        elif isinstance(contents, Fill):
+            if len(contents.byte) != 1:
+                raise ValueError(f"expected a single byte, got {contents.byte!r}")
+            if contents.byte == b"\0":
+                fobj.truncate(contents.size)
+                return
+            chunk = contents.byte * min(contents.size, CHUNK_SIZE)
+            remaining = contents.size
+            while remaining:
+                remaining -= fobj.write(chunk[:remaining])
+        elif hasattr(contents, "read"):
+            _copy_fileobj(contents, fobj)
+        else:
+            for chunk in contents:
+                fobj.write(chunk)
 
 
 class TmpDir(type(Path())):
-    def gen(self, struct, text=""):
+    def gen(self, struct, text="", *, jobs=None, cache=None):
+        """Create files and directories described by `struct`.
+
+        File contents can be str (written as utf-8), bytes-like objects,
+        iterables of bytes chunks, binary file objects (copied in the kernel
+        when possible), or a `Fill` spec for files of a given size. Streamed
+        contents are written in bounded chunks.
+
+        With `jobs`, the struct is flattened first, each directory is created
+        once (parents first), and file contents are written using up to
+        `jobs` threads. This is much faster for trees with many files.
+
+        With `cache` (a `TemplateCache`), the tree is built once per distinct
+        struct and copied from the cache on later calls. Only str, bytes-like
+        and `Fill` contents can be cached.
+        """
         if isinstance(struct, (str, bytes, os.PathLike)):
             struct = {struct: text}
+        if cache is not None:
+            cache.materialize(self, struct, jobs=jobs)
+            return list(struct.keys())
+        if jobs is not None:
+            self._gen_bulk(struct, jobs)
+            return list(struct.keys())
+
         for name, contents in struct.items():
             path = self / os.fsdecode(name)
 
@@ -18,13 +180,28 @@ class TmpDir(type(Path())):
                     path.gen(contents)
             else:
                 path.parent.mkdir(parents=True, exist_ok=True)
-                if isinstance(contents, bytes):
-                    path.write_bytes(contents)
-                else:
-                    path.write_text(contents, encoding="utf-8")
+                _write(path, contents)
 
         return list(struct.keys())
 
+    def _gen_bulk(self, struct, jobs):
+        dirs = set()
+        files = []
+        _flatten(self, struct, dirs, files)
+
+        for path in sorted(dirs, key=lambda p: len(p.parts)):
+            _mkdir(path)
+
+        if jobs <= 1 or len(files) <= 1:
+            for path, contents in files:
+                _write(path, contents)
+            return
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # consume the results to re-raise the first error, if any
+            for _ in executor.map(lambda item: _write(*item), files):
+                pass
+
     @contextmanager
     def chdir(self) -> Iterator[None]:
         old = os.getcwd()
@@ -34,7 +211,57 @@ class TmpDir(type(Path())):
         finally:
             os.chdir(old)
 
-    def cat(self):
-        if self.is_dir():
-            return {p.name: p.cat() for p in self.iterdir()}
-        return self.read_text(encoding="utf-8")
+    def cat(self, *, binary=False, max_size=None, lazy=False):
+        """Read the contents of a file, or of a directory tree as a dict.
+
+        With `binary`, contents are returned as bytes instead of being
+        decoded. Files larger than `max_size` are not loaded; their sha256
+        digest (as "sha256:<hexdigest>") is returned instead.
+
+        With `lazy`, a directory is returned as a read-only mapping that only
+        reads the files that are accessed or compared.
+        """
+        if not self.is_dir():
+            return read_contents(self, binary=binary, max_size=max_size)
+        view = CatView(self, binary=binary, max_size=max_size)
+        return view if lazy else view.to_dict()
+
+    def view(self):
+        """Memory-mapped view of the file's contents, for large files.
+
+        Can be searched with `in`, `startswith`, `endswith`, iterated with
+        `lines()`, or compared to a `regex` matcher without reading the
+        whole file into memory. Use it as a context manager to unmap it.
+        """
+        return FileView(self)
+
+    def manifest(self, *, jobs=None, cache=True):
+        """Build a manifest of all files in the tree, keyed by relative path.
+
+        File contents are hashed using up to `jobs` threads. With `cache`,
+        digests are reused for files whose inode, mtime and size are unchanged.
+        """
+        return build_manifest(self, jobs=jobs, cache=cache)
+
+    def compare(self, other, *, jobs=None, cache=True):
+        """Paths added, removed or changed in this tree compared to other.
+
+        `other` can be another directory or a `Manifest`.
+        """
+        if not isinstance(other, Manifest):
+            other = build_manifest(other, jobs=jobs, cache=cache)
+        return self.manifest(jobs=jobs, cache=cache).diff(other)
+
+    @contextmanager
+    def track(self):
+        """Track the files added, removed or modified inside the block.
+
+        Yields a `ChangeSet` that is filled in when the block exits. Files
+        are compared by their stat data, and only the ones modified just
+        before the block are hashed, so this is much cheaper than comparing
+        `cat()` before and after for large trees.
+        """
+        snapshot = Snapshot(self)
+        changes = ChangeSet()
+        yield changes
+        changes.update(snapshot.changes())
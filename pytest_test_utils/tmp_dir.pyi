@@ -1,22 +1,109 @@
 import os
 from pathlib import Path
-from typing import Any, ContextManager, Dict, List, TypeVar, Union, overload
+from typing import (
+    IO,
+    Any,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    NamedTuple,
+    Optional,
+    TypeVar,
+    Union,
+    overload,
+)
+
+from ._cat import CatView
+from ._fileview import FileView
+from ._manifest import ChangeSet, Manifest, ManifestDiff
+from .template_cache import TemplateCache
 
 T = TypeVar("T", str, bytes)
 Text = Union[str, bytes]
 AnyPath = Union[T, os.PathLike[T]]
-AnyStruct = Dict[AnyPath[T], Union[Text, Dict[AnyPath[T], Any]]]
+
+class Fill(NamedTuple):
+    size: int
+    byte: bytes = ...
+
+Contents = Union[Text, bytearray, memoryview, Fill, IO[bytes], Iterator[bytes]]
+AnyStruct = Dict[AnyPath[T], Union[Contents, Dict[AnyPath[T], Any]]]
 StrStruct = AnyStruct[str]
 BytesStruct = AnyStruct[bytes]
 
 CatStruct = Union[str, Dict[str, Union[str, Dict[str, Any]]]]
+BytesCatStruct = Union[Text, Dict[str, Union[Text, Dict[str, Any]]]]
+
+BLOCK_SIZE: int
+CHUNK_SIZE: int
+
+def estimate_size(struct: Mapping[Any, Any]) -> int: ...
 
 class TmpDir(Path):
     @overload
-    def gen(self, struct: AnyPath[T], text: Text = "") -> List[T]: ...
+    def gen(
+        self,
+        struct: AnyPath[T],
+        text: Contents = "",
+        *,
+        jobs: Optional[int] = None,
+        cache: Optional[TemplateCache] = None,
+    ) -> List[T]: ...
     @overload
-    def gen(self, struct: BytesStruct, text: Text = "") -> List[bytes]: ...
+    def gen(
+        self,
+        struct: BytesStruct,
+        text: Contents = "",
+        *,
+        jobs: Optional[int] = None,
+        cache: Optional[TemplateCache] = None,
+    ) -> List[bytes]: ...
     @overload
-    def gen(self, struct: StrStruct, text: Text = "") -> List[str]: ...
+    def gen(
+        self,
+        struct: StrStruct,
+        text: Contents = "",
+        *,
+        jobs: Optional[int] = None,
+        cache: Optional[TemplateCache] = None,
+    ) -> List[str]: ...
     def chdir(self) -> ContextManager[None]: ...
-    def cat(self) -> CatStruct: ...
+    @overload
+    def cat(
+        self,
+        *,
+        binary: Literal[False] = False,
+        max_size: Optional[int] = None,
+        lazy: Literal[False] = False,
+    ) -> CatStruct: ...
+    @overload
+    def cat(
+        self,
+        *,
+        binary: Literal[True],
+        max_size: Optional[int] = None,
+        lazy: Literal[False] = False,
+    ) -> BytesCatStruct: ...
+    @overload
+    def cat(
+        self,
+        *,
+        binary: bool = False,
+        max_size: Optional[int] = None,
+        lazy: Literal[True],
+    ) -> Union[Text, CatView]: ...
+    def view(self) -> FileView: ...
+    def manifest(
+        self, *, jobs: Optional[int] = None, cache: bool = True
+    ) -> Manifest: ...
+    def compare(
+        self,
+        other: Union[str, os.PathLike[str], Manifest],
+        *,
+        jobs: Optional[int] = None,
+        cache: bool = True,
+    ) -> ManifestDiff: ...
+    def track(self) -> ContextManager[ChangeSet]: ...
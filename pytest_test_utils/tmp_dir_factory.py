@@ -1,17 +1,269 @@
-from typing import TYPE_CHECKING
+import errno
+import itertools
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
 
-from .tmp_dir import TmpDir
+from ._ram import RAM_ROOT, ram_free
+from .template_cache import DEFAULT_MAX_SIZE, TemplateCache
+from .tmp_dir import TmpDir, estimate_size
 
 if TYPE_CHECKING:
     import pytest
 
 
+class _Trash:
+    """Directories moved aside and then removed by background threads.
+
+    At most `maxsize` directories wait to be removed; once the queue is full,
+    `put` blocks until the workers catch up.
+    """
+
+    def __init__(self, root: Path, jobs: int = 4, maxsize: int = 32) -> None:
+        self.root = Path(tempfile.mkdtemp(prefix=".trash-", dir=root))
+        self._queue: "queue.Queue[Optional[Path]]" = queue.Queue(maxsize=maxsize)
+        self._workers = [
+            threading.Thread(target=self._run, name="tmp-dir-cleanup", daemon=True)
+            for _ in range(jobs)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _run(self) -> None:
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            shutil.rmtree(path, ignore_errors=True)
+
+    def put(self, path: Path) -> None:
+        trash = self.root / uuid.uuid4().hex
+        try:
+            os.rename(path, trash)
+        except OSError:
+            trash = path  # e.g. on a different filesystem, remove it in place
+        self._queue.put(trash)
+
+    def close(self) -> None:
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class _DirPool:
+    """Empty directories created ahead of time by a background thread."""
+
+    def __init__(self, root: Path, size: int) -> None:
+        self.root = Path(tempfile.mkdtemp(prefix=".pool-", dir=root))
+        self._counter = itertools.count()
+        self._ready: "queue.Queue[Path]" = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._filler: Optional[threading.Thread] = None
+        if size:
+            self._filler = threading.Thread(
+                target=self._fill, name="tmp-dir-pool", daemon=True
+            )
+            self._filler.start()
+
+    def _new(self) -> Path:
+        path = self.root / str(next(self._counter))
+        os.mkdir(path)
+        return path
+
+    def _fill(self) -> None:
+        while not self._stop.is_set():
+            path = self._new()
+            while True:
+                try:
+                    self._ready.put(path, timeout=0.1)
+                    break
+                except queue.Full:
+                    if self._stop.is_set():
+                        os.rmdir(path)
+                        return
+
+    def acquire(self) -> Path:
+        try:
+            return self._ready.get_nowait()
+        except queue.Empty:
+            return self._new()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._filler is not None:
+            self._filler.join()
+        while True:
+            try:
+                os.rmdir(self._ready.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            os.rmdir(self.root)
+        except OSError:
+            pass  # keep directories of failed tests
+
+
 class TempDirFactory:
-    def __init__(self, tmp_path_factory: "pytest.TempPathFactory") -> None:
+    """Factory of `TmpDir`s, wrapping pytest's `tmp_path_factory`.
+
+    `acquire` hands out empty directories from a pool of `pool_size`
+    directories pre-created in a background thread. Each process (e.g. each
+    pytest-xdist worker) keeps its own pool inside its own basetemp.
+
+    `discard` (and `release`) move a directory into a trash area, to be
+    removed by `cleanup_jobs` background threads. At most
+    `cleanup_queue_size` directories wait to be removed at any time.
+
+    With `ram`, directories are created on a RAM-backed filesystem
+    (`/dev/shm`) when it's available and has enough free space, falling back
+    to the basetemp otherwise. `close` moves RAM-backed directories that were
+    neither discarded nor kept into the basetemp (see `keep`), and removes
+    the RAM-backed root.
+    """
+
+    def __init__(
+        self,
+        tmp_path_factory: "pytest.TempPathFactory",
+        pool_size: int = 0,
+        cleanup_jobs: int = 4,
+        cleanup_queue_size: int = 32,
+        ram: bool = False,
+    ) -> None:
         self.tmp_path_factory = tmp_path_factory
+        self.pool_size = pool_size
+        self.cleanup_jobs = cleanup_jobs
+        self.cleanup_queue_size = cleanup_queue_size
+        self._pool: Optional[_DirPool] = None
+        self._trash: Optional[_Trash] = None
+        self.ram = ram
+        self._ram_basetemp: Optional[Path] = None
+        self._lock = threading.RLock()
+
+    def mktemp(
+        self,
+        basename: str,
+        numbered: bool = True,
+        *,
+        ram: Optional[bool] = None,
+        size: int = 0,
+        struct: Optional[Dict[Any, Any]] = None,
+    ) -> TmpDir:
+        """Create a new directory, populated with `gen(struct)` if given.
 
-    def mktemp(self, basename: str, numbered: bool = True) -> TmpDir:
-        return TmpDir(self.tmp_path_factory.mktemp(basename, numbered=numbered))
+        With `ram` (defaults to the factory's `ram`), it's created on the
+        RAM-backed filesystem if it has room for `size` bytes plus the
+        estimated size of `struct`.
+        """
+        if ram is None:
+            ram = self.ram
+        root = None
+        if ram:
+            if struct is not None:
+                size += estimate_size(struct)
+            root = self.ram_basetemp(size)
+
+        if root is None:
+            path = TmpDir(self.tmp_path_factory.mktemp(basename, numbered=numbered))
+        elif numbered:
+            path = TmpDir(tempfile.mkdtemp(prefix=basename, dir=root))
+        else:
+            path = TmpDir(root / basename)
+            path.mkdir()
+        if struct is not None:
+            path.gen(struct)
+        return path
+
+    def ram_basetemp(self, size: int = 0) -> Optional[TmpDir]:
+        """Root for RAM-backed directories, None if there is no room for size."""
+        free = ram_free()
+        if free is None or free < size:
+            return None
+        with self._lock:
+            if self._ram_basetemp is None:
+                self._ram_basetemp = Path(
+                    tempfile.mkdtemp(prefix="pytest-test-utils-", dir=RAM_ROOT)
+                )
+        return TmpDir(self._ram_basetemp)
 
     def getbasetemp(self) -> TmpDir:
         return TmpDir(self.tmp_path_factory.getbasetemp())
+
+    def acquire(self) -> TmpDir:
+        """Empty directory to be returned with `release` once it's not needed."""
+        with self._lock:
+            if self._pool is None:
+                root = self.ram_basetemp() if self.ram else None
+                self._pool = _DirPool(root or self.getbasetemp(), self.pool_size)
+        return TmpDir(self._pool.acquire())
+
+    def release(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        """Remove a directory returned by `acquire`, in the background."""
+        assert self._pool is not None, "release() called before acquire()"
+        self.discard(path)
+
+    def discard(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        """Move a directory into the trash, to be removed in the background.
+
+        Blocks while too many directories are waiting to be removed.
+        """
+        with self._lock:
+            if self._trash is None:
+                self._trash = _Trash(
+                    self.getbasetemp(), self.cleanup_jobs, self.cleanup_queue_size
+                )
+        self._trash.put(Path(path))
+
+    def keep(self, path: Union[str, "os.PathLike[str]"], basename: str) -> TmpDir:
+        """Move a directory to a new numbered one in the basetemp.
+
+        Directories kept for debugging are then removed by pytest's own
+        retention policy (`tmp_path_retention_count`), which does not cover
+        the RAM-backed filesystem.
+        """
+        if Path(path).parent == self.getbasetemp():
+            return TmpDir(path)
+        dst = self.tmp_path_factory.mktemp(basename)
+        dst.rmdir()
+        try:
+            os.replace(path, dst)
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+            shutil.copytree(path, dst, symlinks=True)
+            shutil.rmtree(path)
+        return TmpDir(dst)
+
+    def close(self) -> None:
+        """Stop the pool, wait until discarded directories are removed, and
+        move what is left on the RAM-backed filesystem to the basetemp."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            if self._trash is not None:
+                self._trash.close()
+                self._trash = None
+            if self._ram_basetemp is not None:
+                # nothing cleans up the RAM-backed filesystem after us
+                for entry in os.scandir(self._ram_basetemp):
+                    self.keep(entry.path, entry.name.lstrip("."))
+                os.rmdir(self._ram_basetemp)
+                self._ram_basetemp = None
+
+    def template_cache(
+        self, max_size: int = DEFAULT_MAX_SIZE, hardlink: bool = False
+    ) -> TemplateCache:
+        basetemp = self.getbasetemp()
+        if os.environ.get("PYTEST_XDIST_WORKER"):
+            # pytest-xdist workers get their own basetemp inside a shared one
+            basetemp = basetemp.parent
+        return TemplateCache(
+            basetemp / ".template-cache", max_size=max_size, hardlink=hardlink
+        )
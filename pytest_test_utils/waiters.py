@@ -1,18 +1,482 @@
+import asyncio
+import ctypes
+import errno
+import inspect
+import os
+import random
+import select
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from time import perf_counter, sleep
-from typing import Callable, TypeVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    TypeVar,
+    Union,
+)
 
 _T = TypeVar("_T")
 
+# from sys/inotify.h
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
 
 class TimedOutError(Exception):
     pass
 
 
-def wait_until(pred: Callable[[], _T], timeout: float, pause: float = 1) -> _T:
-    start = perf_counter()
-    while (perf_counter() - start) < timeout:
-        value = pred()
+class WaitRecord(NamedTuple):
+    """Statistics of a single wait, passed to the wait listeners."""
+
+    location: str
+    polls: int
+    pred_time: float
+    sleep_time: float
+    duration: float
+    outcome: str  # "passed", "timeout" or "error"
+
+
+_listeners: List[Callable[[WaitRecord], None]] = []
+
+
+def add_listener(listener: Callable[[WaitRecord], None]) -> None:
+    """Call `listener` with a `WaitRecord` after every wait."""
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Callable[[WaitRecord], None]) -> None:
+    _listeners.remove(listener)
+
+
+def _caller_location(depth: int) -> str:
+    if not _listeners:
+        return ""
+    frame = sys._getframe(depth + 1)
+    return f"{frame.f_code.co_filename}:{frame.f_lineno}"
+
+
+class _WaitStats:
+    def __init__(self) -> None:
+        self.start = perf_counter()
+        self.polls = 0
+        self.pred_time = 0.0
+        self.sleep_time = 0.0
+
+    def call(self, pred: Callable[[], _T]) -> _T:
+        start = perf_counter()
+        try:
+            return pred()
+        finally:
+            self.polls += 1
+            self.pred_time += perf_counter() - start
+
+    async def call_async(self, pred: Callable[[], Union[_T, Awaitable[_T]]]) -> _T:
+        start = perf_counter()
+        try:
+            value = pred()
+            if inspect.isawaitable(value):
+                result: _T = await value
+                return result
+            return value  # type: ignore[return-value]
+        finally:
+            self.polls += 1
+            self.pred_time += perf_counter() - start
+
+    def sleep(self, delay: float, waker: Optional["Waker"] = None) -> None:
+        start = perf_counter()
+        if waker is not None:
+            waker.wait(delay)
+        else:
+            sleep(delay)
+        self.sleep_time += perf_counter() - start
+
+    async def sleep_async(
+        self, delay: float, wake: Optional[asyncio.Event] = None
+    ) -> None:
+        start = perf_counter()
+        if wake is None:
+            await asyncio.sleep(delay)
+        else:
+            try:
+                await asyncio.wait_for(wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                wake.clear()
+        self.sleep_time += perf_counter() - start
+
+    def add(self, other: "_WaitStats") -> None:
+        self.polls += other.polls
+        self.pred_time += other.pred_time
+        self.sleep_time += other.sleep_time
+
+
+@contextmanager
+def _recording(location: str) -> Iterator[_WaitStats]:
+    stats = _WaitStats()
+    outcome = "error"
+    try:
+        yield stats
+        outcome = "passed"
+    except TimedOutError:
+        outcome = "timeout"
+        raise
+    finally:
+        if _listeners:
+            duration = perf_counter() - stats.start
+            record = WaitRecord(
+                location,
+                stats.polls,
+                stats.pred_time,
+                stats.sleep_time,
+                duration,
+                outcome,
+            )
+            for listener in list(_listeners):
+                listener(record)
+
+
+class Waker(Protocol):
+    def wait(self, timeout: float) -> Any:
+        """Block until woken up, or until the timeout expires."""
+
+
+class EventWaker:
+    """Wakes up when the `threading.Event` is set, and clears it again."""
+
+    def __init__(self, event: threading.Event) -> None:
+        self.event = event
+
+    def wait(self, timeout: float) -> bool:
+        woken = self.event.wait(timeout)
+        if woken:
+            self.event.clear()
+        return woken
+
+
+class SocketWaker:
+    """Wakes up when the socket (or any object with fileno()) is readable."""
+
+    def __init__(self, sock: Any) -> None:
+        self.sock = sock
+
+    def wait(self, timeout: float) -> bool:
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable)
+
+
+def _inotify_init(path: str, mask: int) -> Optional[int]:
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError, TypeError):
+        return None
+
+    fd: int = init(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    if add_watch(fd, os.fsencode(path), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class FileWaker:
+    """Wakes up when a file or directory changes.
+
+    Uses inotify where available, watching the parent directory of a file so
+    that creating, replacing or removing it is noticed too. Otherwise,
+    falls back to polling `os.stat` every `interval` seconds.
+    """
+
+    def __init__(
+        self, path: Union[str, "os.PathLike[str]"], interval: float = 0.01
+    ) -> None:
+        self.path = os.fspath(path)
+        self.interval = interval
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE
+        mask |= IN_MOVED_FROM | IN_MOVED_TO
+        if os.path.isdir(self.path):
+            watched = self.path
+        else:
+            watched = os.path.dirname(os.path.abspath(self.path))
+        self._fd = _inotify_init(watched, mask)
+        self._stat = self._signature()
+
+    def _signature(self) -> Any:
+        try:
+            st = os.stat(self.path)
+        except OSError as exc:
+            return exc.errno
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _drain(self) -> None:
+        assert self._fd is not None
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except OSError as exc:
+            if exc.errno != errno.EAGAIN:
+                raise
+
+    def wait(self, timeout: float) -> bool:
+        if self._fd is not None:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if readable:
+                self._drain()
+            return bool(readable)
+
+        deadline = perf_counter() + timeout
+        while True:
+            stat = self._signature()
+            if stat != self._stat:
+                self._stat = stat
+                return True
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                return False
+            sleep(min(self.interval, remaining))
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "FileWaker":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+@contextmanager
+def _as_waker(wake: Any) -> Iterator[Optional[Waker]]:
+    if isinstance(wake, threading.Event):
+        yield EventWaker(wake)
+    elif isinstance(wake, (str, os.PathLike)):
+        with FileWaker(wake) as waker:
+            yield waker
+    elif wake is not None and not hasattr(wake, "wait") and hasattr(wake, "fileno"):
+        yield SocketWaker(wake)
+    else:
+        yield wake
+
+
+def _check_jitter(jitter: float) -> None:
+    # the pause is scaled by up to 1 +/- jitter, which must not be negative
+    if not 0 <= jitter < 1:
+        raise ValueError(f"jitter must be in [0, 1), not {jitter!r}")
+
+
+def _pauses(
+    pause: float, backoff: float, max_pause: Optional[float], jitter: float
+) -> Iterator[float]:
+    while True:
+        delay = pause if max_pause is None else min(pause, max_pause)
+        if jitter:
+            delay *= 1 + random.uniform(-jitter, jitter)  # noqa: S311
+        yield delay
+        pause *= backoff
+
+
+def wait_until(
+    pred: Callable[[], _T],
+    timeout: float,
+    pause: float = 1,
+    *,
+    backoff: float = 1,
+    max_pause: Optional[float] = None,
+    jitter: float = 0,
+    wake: Any = None,
+) -> _T:
+    """Call `pred` until it returns a truthy value, and return that value.
+
+    Between calls, waits for `pause` seconds, which is multiplied by
+    `backoff` after every call (up to `max_pause`) and randomized by
+    +/- `jitter` (as a fraction of the pause, from 0 up to but excluding 1).
+
+    With `wake`, the pause ends early as soon as the condition could have
+    changed. It can be a `threading.Event`, a path to watch, a socket to wait
+    on until it's readable, or any object with a `wait(timeout)` method.
+
+    Raises `TimedOutError` if `pred` is not truthy within `timeout` seconds.
+    """
+    _check_jitter(jitter)
+    with _recording(_caller_location(1)) as stats:
+        deadline = stats.start + timeout
+        pauses = _pauses(pause, backoff, max_pause, jitter)
+        with _as_waker(wake) as waker:
+            while perf_counter() < deadline:
+                value = stats.call(pred)
+                if value:
+                    return value
+                delay = min(next(pauses), max(deadline - perf_counter(), 0))
+                stats.sleep(delay, waker)
+        raise TimedOutError("Timeout reached while waiting")
+
+
+async def _wait_until_async(
+    pred: Callable[[], Union[_T, Awaitable[_T]]],
+    timeout: float,
+    pauses: Iterator[float],
+    wake: Optional[asyncio.Event],
+    stats: _WaitStats,
+) -> _T:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        value = await stats.call_async(pred)
         if value:
             return value
-        sleep(pause)
+        delay = min(next(pauses), max(deadline - loop.time(), 0))
+        await stats.sleep_async(delay, wake)
     raise TimedOutError("Timeout reached while waiting")
+
+
+async def wait_until_async(
+    pred: Callable[[], Union[_T, Awaitable[_T]]],
+    timeout: float,
+    pause: float = 1,
+    *,
+    backoff: float = 1,
+    max_pause: Optional[float] = None,
+    jitter: float = 0,
+    wake: Optional[asyncio.Event] = None,
+) -> _T:
+    """Asynchronous version of `wait_until`, which doesn't block the loop.
+
+    `pred` can be a regular function or a coroutine function, and `wake`
+    can be an `asyncio.Event`, which is cleared after waking up.
+    """
+    _check_jitter(jitter)
+    with _recording(_caller_location(1)) as stats:
+        pauses = _pauses(pause, backoff, max_pause, jitter)
+        return await _wait_until_async(pred, timeout, pauses, wake, stats)
+
+
+def _describe(pred: Callable[..., Any]) -> str:
+    return getattr(pred, "__qualname__", None) or repr(pred)
+
+
+def _timed_out(
+    preds: Sequence[Callable[..., Any]], elapsed: List[Optional[float]], timeout: float
+) -> TimedOutError:
+    pending = sum(1 for took in elapsed if took is None)
+    lines = [f"Timeout reached while waiting for {pending} of {len(preds)} conditions:"]
+    for pred, took in zip(preds, elapsed):
+        if took is None:
+            lines.append(f"  - {_describe(pred)}: not true after {timeout:.3f}s")
+        else:
+            lines.append(f"  - {_describe(pred)}: true after {took:.3f}s")
+    return TimedOutError("\n".join(lines))
+
+
+def wait_until_all(
+    preds: Sequence[Callable[[], _T]],
+    timeout: float,
+    pause: float = 1,
+    *,
+    backoff: float = 1,
+    max_pause: Optional[float] = None,
+    jitter: float = 0,
+    max_workers: Optional[int] = None,
+) -> List[_T]:
+    """Wait for all predicates concurrently, under a single shared timeout.
+
+    Each predicate is polled in its own thread like in `wait_until` (at most
+    `max_workers` at once, all of them by default). Returns their truthy
+    values, in order.
+
+    Raises `TimedOutError` listing the predicates that never became true,
+    and how long the others took. If a predicate raises, the others are
+    stopped and the exception is propagated.
+    """
+    _check_jitter(jitter)
+    with _recording(_caller_location(1)) as stats:
+        deadline = stats.start + timeout
+        stop = threading.Event()
+        results: List[Any] = [None] * len(preds)
+        elapsed: List[Optional[float]] = [None] * len(preds)
+        thread_stats = [_WaitStats() for _ in preds]
+
+        def poll(index: int, pred: Callable[[], _T]) -> None:
+            pauses = _pauses(pause, backoff, max_pause, jitter)
+            while not stop.is_set() and perf_counter() < deadline:
+                value = thread_stats[index].call(pred)
+                if value:
+                    results[index] = value
+                    elapsed[index] = perf_counter() - stats.start
+                    return
+                delay = min(next(pauses), max(deadline - perf_counter(), 0))
+                thread_stats[index].sleep(delay, stop)
+
+        try:
+            if preds:
+                with ThreadPoolExecutor(max_workers or len(preds)) as executor:
+                    futures = [
+                        executor.submit(poll, *item) for item in enumerate(preds)
+                    ]
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    finally:
+                        stop.set()
+        finally:
+            for other in thread_stats:
+                stats.add(other)
+
+        if any(took is None for took in elapsed):
+            raise _timed_out(preds, elapsed, timeout)
+        return results
+
+
+async def wait_until_all_async(
+    preds: Sequence[Callable[[], Union[_T, Awaitable[_T]]]],
+    timeout: float,
+    pause: float = 1,
+    *,
+    backoff: float = 1,
+    max_pause: Optional[float] = None,
+    jitter: float = 0,
+) -> List[_T]:
+    """Asynchronous version of `wait_until_all`, polling on the event loop."""
+    _check_jitter(jitter)
+    with _recording(_caller_location(1)) as stats:
+        elapsed: List[Optional[float]] = [None] * len(preds)
+
+        async def poll(index: int, pred: Callable[[], Union[_T, Awaitable[_T]]]) -> Any:
+            pauses = _pauses(pause, backoff, max_pause, jitter)
+            try:
+                value = await _wait_until_async(pred, timeout, pauses, None, stats)
+            except TimedOutError:
+                return None
+            elapsed[index] = perf_counter() - stats.start
+            return value
+
+        tasks = [asyncio.ensure_future(poll(*item)) for item in enumerate(preds)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        if any(took is None for took in elapsed):
+            raise _timed_out(preds, elapsed, timeout)
+        return results
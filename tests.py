@@ -1,17 +1,55 @@
+import asyncio
+import hashlib
+import io
+import json
 import os
-from datetime import datetime, timedelta
+import re
+import socket
+import subprocess
+import sys
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from time import perf_counter
 from types import SimpleNamespace
-from typing import Type
-from unittest.mock import MagicMock
+from typing import TYPE_CHECKING, Callable, Iterator, List, Type
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 import pytest
 
-from pytest_test_utils import TmpDir, matchers
+from pytest_test_utils import (
+    GoldenSnapshot,
+    Perf,
+    TemplateCache,
+    TmpDir,
+    _repr,
+    matchers,
+)
+from pytest_test_utils._cat import CatView
+from pytest_test_utils._manifest import ManifestDiff, file_digest
+from pytest_test_utils._ram import RAM_ROOT, ram_free
 from pytest_test_utils.matchers import Matcher
+from pytest_test_utils.perf import Budget, BudgetExceeded, Measurement, PerfRecord
+from pytest_test_utils.pytest_plugin import PerfReporter, WaitReporter
+from pytest_test_utils.template_cache import struct_key
+from pytest_test_utils.tmp_dir import BLOCK_SIZE, CHUNK_SIZE, Fill, estimate_size
 from pytest_test_utils.tmp_dir_factory import TempDirFactory
-from pytest_test_utils.waiters import TimedOutError, wait_until
+from pytest_test_utils.waiters import (
+    TimedOutError,
+    WaitRecord,
+    add_listener,
+    remove_listener,
+    wait_until,
+    wait_until_all,
+    wait_until_all_async,
+    wait_until_async,
+)
+
+if TYPE_CHECKING:
+    from pytest_test_utils.tmp_dir import StrStruct
+
+pytest_plugins = ["pytester"]
 
 
 def test_is_tmp_dir(tmp_dir: TmpDir) -> None:
@@ -62,6 +100,98 @@ def test_gen_dict_bytes(tmp_dir: TmpDir) -> None:
     assert (tmp_dir / os.fsdecode("dir") / os.fsdecode("file")).read_bytes() == b"ipsum"
 
 
+def test_gen_buffers(tmp_dir: TmpDir) -> None:
+    data = bytearray(b"lorem ipsum")
+    tmp_dir.gen({"array": data, "view": memoryview(data)[6:]})
+    assert tmp_dir.cat() == {"array": "lorem ipsum", "view": "ipsum"}
+
+
+def test_gen_stream(tmp_dir: TmpDir) -> None:
+    source = tmp_dir / "source"
+    source.write_bytes(b"lorem ipsum")
+
+    def chunks() -> Iterator[bytes]:
+        yield b"lorem"
+        yield b" ipsum"
+
+    with source.open("rb") as fobj:
+        fobj.seek(6)
+        tmp_dir.gen({"gen": chunks(), "file": fobj, "bytesio": io.BytesIO(b"dolor")})
+        assert fobj.tell() == 11
+    assert (tmp_dir / "gen").read_bytes() == b"lorem ipsum"
+    assert (tmp_dir / "file").read_bytes() == b"ipsum"
+    assert (tmp_dir / "bytesio").read_bytes() == b"dolor"
+
+
+def test_gen_fill(tmp_dir: TmpDir) -> None:
+    size = 3 * CHUNK_SIZE + 1
+    tmp_dir.gen({"sparse": Fill(size), "filled": Fill(size, b"x")}, jobs=2)
+    sparse, filled = tmp_dir / "sparse", tmp_dir / "filled"
+    assert sparse.stat().st_size == filled.stat().st_size == size
+    assert sparse.read_bytes() == b"\0" * size
+    assert filled.read_bytes() == b"x" * size
+    with pytest.raises(ValueError, match="expected a single byte"):
+        tmp_dir.gen("invalid", Fill(1, b"xy"))
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_gen_jobs(tmp_dir: TmpDir, jobs: int) -> None:
+    sub = {f"file{i}": str(i) for i in range(10)}
+    assert tmp_dir.gen(
+        {"file": "lorem", "empty": {}, "dir": {"file": b"ipsum", "sub": sub}},
+        jobs=jobs,
+    ) == ["file", "empty", "dir"]
+    assert tmp_dir.cat() == {
+        "file": "lorem",
+        "empty": {},
+        "dir": {"file": "ipsum", "sub": sub},
+    }
+
+
+def test_gen_jobs_errors(tmp_dir: TmpDir) -> None:
+    tmp_dir.gen("file", "lorem")
+    with pytest.raises(FileExistsError):
+        tmp_dir.gen({"file": {"nested": "ipsum"}}, jobs=4)
+    with pytest.raises(TypeError):
+        tmp_dir.gen({"foo": "foo", "bar": 1}, jobs=4)  # type: ignore[dict-item]
+
+
+def test_gen_cache(tmp_dir: TmpDir, template_cache: TemplateCache) -> None:
+    struct: "StrStruct" = {"file": "lorem", "dir": {"file": b"ipsum", "empty": {}}}
+    for name in ("first", "second"):
+        target = tmp_dir / name
+        target.mkdir()
+        assert target.gen(struct, cache=template_cache) == ["file", "dir"]
+        assert target.cat() == {"file": "lorem", "dir": {"file": "ipsum", "empty": {}}}
+
+    assert [p.name for p in template_cache.root.iterdir()] == [struct_key(struct)]
+    (tmp_dir / "first" / "file").write_text("changed")
+    assert (tmp_dir / "second" / "file").read_text() == "lorem"
+
+
+def test_gen_cache_hardlink_and_eviction(tmp_dir: TmpDir) -> None:
+    cache = TemplateCache(tmp_dir / "cache", max_size=10, hardlink=True)
+    (tmp_dir / "a").gen({"foo": "foo" * 3}, cache=cache)
+    (tmp_dir / "b").gen({"foo": "foo" * 3}, cache=cache)
+    first, second = (tmp_dir / "a" / "foo").stat(), (tmp_dir / "b" / "foo").stat()
+    assert first.st_ino == second.st_ino
+
+    (tmp_dir / "c").gen({"bar": "bar" * 3}, cache=cache)
+    assert [p.name for p in cache.root.iterdir()] == [struct_key({"bar": "bar" * 3})]
+
+
+def test_struct_key() -> None:
+    assert struct_key({"a": "1", "b": {"c": b"2"}}) == struct_key(
+        {b"b": {"c": b"2"}, "a": "1"}
+    )
+    assert struct_key({"a": "1"}) != struct_key({"a": b"1"})
+    assert struct_key({"a": {}}) != struct_key({"a": ""})
+    assert struct_key({"a": bytearray(b"1")}) == struct_key({"a": b"1"})
+    assert struct_key({"a": Fill(2)}) != struct_key({"a": Fill(2, b"x")})
+    with pytest.raises(TypeError, match="cannot cache"):
+        struct_key({"a": io.BytesIO(b"1")})
+
+
 def test_chdir(tmp_path: Path, tmp_dir: TmpDir) -> None:
     subdir = tmp_dir / "dir"
     subdir.mkdir()
@@ -79,6 +209,135 @@ def test_cat(tmp_dir: TmpDir) -> None:
     assert (tmp_dir / "dir" / "file").cat() == "lorem ipsum"
 
 
+def test_cat_binary_and_max_size(tmp_dir: TmpDir) -> None:
+    tmp_dir.gen({"bin": b"\xff\xfe", "big": "lorem ipsum", "crlf": b"a\r\nb"})
+
+    assert tmp_dir.cat(binary=True) == {
+        "bin": b"\xff\xfe",
+        "big": b"lorem ipsum",
+        "crlf": b"a\r\nb",
+    }
+    digest = hashlib.sha256(b"lorem ipsum").hexdigest()
+    assert (tmp_dir / "big").cat(max_size=5) == f"sha256:{digest}"
+    assert (tmp_dir / "big").cat(max_size=11) == "lorem ipsum"
+    assert (tmp_dir / "crlf").cat() == "a\nb"
+
+
+def test_cat_lazy(tmp_dir: TmpDir, M: Type[Matcher]) -> None:
+    tmp_dir.gen({"bin": b"\xff\xfe", "dir": {"file": "lorem ipsum", "empty": {}}})
+
+    view = tmp_dir.cat(lazy=True)
+    assert isinstance(view, CatView)
+    assert sorted(view) == ["bin", "dir"]
+    # only the compared files are read, so undecodable "bin" is never touched
+    assert view == M.dict(dir={"file": "lorem ipsum", "empty": {}})
+    assert view != {"dir": {"file": "lorem ipsum", "empty": {}}}
+    assert view["dir"] == {"file": "lorem ipsum", "empty": {}}
+    assert {"file": M.re("^lorem"), "empty": {}} == view["dir"]
+    with pytest.raises(UnicodeDecodeError):
+        view.to_dict()
+
+
+def test_view(tmp_dir: TmpDir, M: Type[Matcher]) -> None:
+    tmp_dir.gen({"log": "started\nprocessing café\r\nfinished", "empty": ""})
+
+    with (tmp_dir / "log").view() as view:
+        assert len(view) == 34
+        assert "café" in view
+        assert b"missing" not in view
+        assert view.startswith("started\n")
+        assert view.endswith(b"finished")
+        assert not view.endswith("x" * 100)
+        assert list(view.lines()) == [
+            b"started\n",
+            "processing café\r\n".encode(),
+            b"finished",
+        ]
+        assert view == M.re(r"^processing café\r$", re.MULTILINE)
+        assert view == M.re(rb"^started", mode="match")
+        assert view != M.re("finished", mode="match")
+
+    with (tmp_dir / "empty").view() as view:
+        assert len(view) == 0
+        assert list(view.lines()) == []
+        assert view == M.re("^$", mode="fullmatch")
+
+
+def test_manifest(tmp_dir: TmpDir) -> None:
+    tmp_dir.gen({"file": "lorem", "dir": {"file": "ipsum", "empty": {}}})
+
+    manifest = tmp_dir.manifest(jobs=2)
+    assert sorted(manifest) == ["dir/file", "file"]
+    assert manifest["file"] == (5, (tmp_dir / "file").stat().st_mtime_ns, Matcher.any)
+    assert manifest["file"].digest != manifest["dir/file"].digest
+
+
+def test_manifest_cache(tmp_dir: TmpDir) -> None:
+    tmp_dir.gen("file", "lorem")
+    os.utime("file", ns=(0, 0))
+    digest = tmp_dir.manifest()["file"].digest
+
+    with patch("pytest_test_utils._manifest.file_digest") as file_digest:
+        assert tmp_dir.manifest()["file"].digest == digest
+        assert tmp_dir.manifest(cache=False)["file"].digest == file_digest.return_value
+
+
+def test_compare(tmp_dir: TmpDir) -> None:
+    golden = tmp_dir / "golden"
+    golden.gen({"same": "lorem", "changed": "ipsum", "removed": "dolor"})
+    actual = tmp_dir / "actual"
+    actual.gen({"same": "lorem", "changed": "IPSUM", "added": "sit"})
+
+    diff = actual.compare(golden)
+    assert diff == ManifestDiff(
+        added=["added"], removed=["removed"], changed=["changed"]
+    )
+    assert diff
+    assert actual.compare(golden.manifest()) == diff
+    assert not golden.compare(golden)
+
+
+def test_track(tmp_dir: TmpDir, M: Type[Matcher]) -> None:
+    tmp_dir.gen(
+        {
+            "same": "lorem",
+            "changed": "ipsum",
+            "removed": "dolor",
+            "dir": {"same": "sit", "racy": "amet"},
+        }
+    )
+    for path in ("same", "changed", "removed", "dir/same"):
+        os.utime(path, ns=(0, 0))
+    racy = (tmp_dir / "dir" / "racy").stat()
+
+    with patch(
+        "pytest_test_utils._manifest.file_digest", wraps=file_digest
+    ) as digest, tmp_dir.track() as changes:
+        assert digest.call_count == 1
+        (tmp_dir / "changed").write_text("IPSUM")
+        (tmp_dir / "removed").unlink()
+        (tmp_dir / "dir" / "added").write_text("consectetur")
+        # same size and mtime, only the contents tell them apart
+        (tmp_dir / "dir" / "racy").write_text("AMET")
+        os.utime("dir/racy", ns=(racy.st_atime_ns, racy.st_mtime_ns))
+    assert digest.call_count == 2
+
+    assert changes == {
+        "added": ["dir/added"],
+        "removed": ["removed"],
+        "modified": ["changed", "dir/racy"],
+        "unchanged": ["dir/same", "same"],
+    }
+    assert changes == M.dict(added=M.unordered("dir/added"), removed=["removed"])
+    assert changes.modified == ["changed", "dir/racy"]
+    assert changes
+
+    with tmp_dir.track() as changes:
+        pass
+    assert not changes
+    assert changes.unchanged == ["changed", "dir/added", "dir/racy", "dir/same", "same"]
+
+
 def test_tmp_dir_factory(
     tmp_path_factory: "pytest.TempPathFactory", tmp_dir_factory: TempDirFactory
 ) -> None:
@@ -97,6 +356,275 @@ def test_tmp_dir_factory(
     assert tmp_dir_factory.getbasetemp() == tmp_path_factory.getbasetemp()
 
 
+def test_tmp_dir_factory_pool(tmp_path_factory: "pytest.TempPathFactory") -> None:
+    factory = TempDirFactory(
+        tmp_path_factory, pool_size=2, cleanup_jobs=2, cleanup_queue_size=1
+    )
+    first = factory.acquire()
+    second = factory.acquire()
+    assert isinstance(first, TmpDir)
+    assert first != second
+    assert list(first.iterdir()) == []
+    assert first.parent == second.parent
+
+    first.gen({"dir": {"file": "lorem"}})
+    factory.release(first)
+    factory.release(second)
+    factory.close()
+    assert not first.exists()
+    assert not second.exists()
+    # pre-created directories are removed too
+    assert not first.parent.exists()
+
+
+def test_tmp_dir_pool_option(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        import os
+
+        def test_one(tmp_dir):
+            assert os.getcwd() == str(tmp_dir)
+            tmp_dir.gen("file", "lorem")
+
+        def test_two(tmp_dir):
+            assert os.getcwd() == str(tmp_dir)
+            assert list(tmp_dir.iterdir()) == []
+
+        def test_fail(tmp_dir):
+            tmp_dir.gen("file", "lorem")
+            assert False
+        """
+    )
+    basetemp = pytester.path / "basetemp"
+    result = pytester.runpytest(
+        "--tmp-dir-pool=2", f"--basetemp={basetemp}", "--junitxml=junit.xml"
+    )
+    result.assert_outcomes(passed=2, failed=1)
+
+    # the directory of a failed test is named after it
+    assert (basetemp / "test_fail0" / "file").read_text() == "lorem"
+    assert not list(basetemp.glob(".pool-*"))
+    result.stdout.fnmatch_lines(
+        [
+            "*= tmp_dirs kept for debugging =*",
+            f"test_tmp_dir_pool_option.py::test_fail: {basetemp / 'test_fail0'}",
+        ]
+    )
+    assert "<property" not in (pytester.path / "junit.xml").read_text()
+
+
+def test_tmp_dir_cleanup_option(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        def test_pass(tmp_dir):
+            tmp_dir.gen({"dir": {"file": "lorem"}})
+
+        def test_fail(tmp_dir):
+            tmp_dir.gen({"dir": {"file": "lorem"}})
+            assert False
+        """
+    )
+    basetemp = pytester.path / "basetemp"
+    result = pytester.runpytest("--tmp-dir-cleanup", f"--basetemp={basetemp}")
+    result.assert_outcomes(passed=1, failed=1)
+
+    assert not (basetemp / "test_pass0").exists()
+    assert not list(basetemp.glob(".trash-*"))
+    assert (basetemp / "test_fail0" / "dir" / "file").read_text() == "lorem"
+
+
+def test_estimate_size() -> None:
+    assert estimate_size({}) == 0
+    assert estimate_size({"empty": "", "file": "lorem", "bin": b"\0" * 4097}) == (
+        3 * BLOCK_SIZE
+    )
+    assert estimate_size({"dir": {"file": "lorem"}}) == 2 * BLOCK_SIZE
+    assert estimate_size(
+        {"view": memoryview(b"x" * 4097), "sparse": Fill(1 << 20)}
+    ) == (2 * BLOCK_SIZE)
+    assert estimate_size({"filled": Fill(1, b"x"), "io": io.BytesIO(b"x")}) == (
+        BLOCK_SIZE
+    )
+
+
+def test_tmp_dir_factory_ram(
+    tmp_path_factory: "pytest.TempPathFactory", monkeypatch: "pytest.MonkeyPatch"
+) -> None:
+    if ram_free() is None:
+        pytest.skip(f"{RAM_ROOT} is not available")
+
+    factory = TempDirFactory(tmp_path_factory, ram=True)
+    ram_dir = factory.mktemp("data", struct={"dir": {"file": "lorem"}})
+    assert str(ram_dir).startswith(RAM_ROOT)
+    assert ram_dir.cat() == {"dir": {"file": "lorem"}}
+
+    disk_dir = factory.mktemp("data", size=1 << 60)
+    assert disk_dir.parent == tmp_path_factory.getbasetemp()
+
+    monkeypatch.setattr("pytest_test_utils._ram.RAM_ROOT", "/nonexistent")
+    assert ram_free() is None
+    assert factory.mktemp("data").parent == tmp_path_factory.getbasetemp()
+
+    root = ram_dir.parent
+    factory.discard(ram_dir)
+    factory.close()
+    assert not root.exists()
+
+
+def test_tmp_dir_factory_keep(tmp_path_factory: "pytest.TempPathFactory") -> None:
+    if ram_free() is None:
+        pytest.skip(f"{RAM_ROOT} is not available")
+
+    factory = TempDirFactory(tmp_path_factory, ram=True)
+    ram_dir = factory.mktemp("data", struct={"dir": {"file": "lorem"}})
+    root = ram_dir.parent
+    kept = factory.keep(ram_dir, "test_fail")
+    assert kept.parent == tmp_path_factory.getbasetemp()
+    assert kept.name.startswith("test_fail")
+    assert kept.cat() == {"dir": {"file": "lorem"}}
+    assert not ram_dir.exists()
+    assert factory.keep(kept, "test_fail") == kept
+
+    factory.close()
+    assert not root.exists()
+
+
+def test_tmp_dir_factory_ram_leftovers(
+    tmp_path_factory: "pytest.TempPathFactory",
+) -> None:
+    if ram_free() is None:
+        pytest.skip(f"{RAM_ROOT} is not available")
+
+    factory = TempDirFactory(tmp_path_factory, pool_size=1, ram=True)
+    ram_dir = factory.mktemp("leftover", struct={"file": "lorem"})
+    pooled = factory.acquire()
+    pooled.gen("file", "ipsum")
+    root = ram_dir.parent
+    assert pooled.parent.parent == root
+
+    factory.close()
+    # nothing is left behind on the RAM-backed filesystem
+    assert not root.exists()
+    basetemp = TmpDir(tmp_path_factory.getbasetemp())
+    assert (basetemp / f"{ram_dir.name}0").cat() == {"file": "lorem"}
+    pool = basetemp / f"{pooled.parent.name.lstrip('.')}0"
+    assert pool.cat() == {pooled.name: {"file": "ipsum"}}
+
+
+def test_tmp_dir_ram_option(pytester: "pytest.Pytester") -> None:
+    if ram_free() is None:
+        pytest.skip(f"{RAM_ROOT} is not available")
+
+    pytester.makepyfile(
+        f"""
+        import pytest
+
+        def test_ram(tmp_dir):
+            assert str(tmp_dir).startswith({RAM_ROOT!r})
+
+        @pytest.mark.tmp_dir_ram(size=1 << 60)
+        def test_too_large(tmp_dir):
+            assert not str(tmp_dir).startswith({RAM_ROOT!r})
+        """
+    )
+    result = pytester.runpytest("--tmp-dir-ram")
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines([f"tmp_dir: RAM-backed ({RAM_ROOT}, * MiB usable)"])
+
+    result = pytester.runpytest("-k", "too_large")
+    result.assert_outcomes(passed=1)
+
+
+def test_golden_snapshot(tmp_dir: TmpDir) -> None:
+    tree = tmp_dir / "tree"
+    tree.gen({"same": "lorem", "changed": "ipsum", "removed": "dolor"})
+    golden = tmp_dir / "golden"
+    # as if the files were written well before the index
+    with patch("pytest_test_utils.golden._is_racy", return_value=False):
+        GoldenSnapshot(golden, "test", update=True).assert_match(tree)
+    assert (golden / "test").cat() == tree.cat()
+    assert (golden / "test.index.json").exists()
+
+    snapshot = GoldenSnapshot(golden, "test")
+    with patch("pytest_test_utils._manifest.file_digest", wraps=file_digest) as digest:
+        snapshot.assert_match(tree)
+    # the golden tree is not read, its digests come from the index
+    assert not [c for c in digest.call_args_list if str(golden) in str(c.args[0])]
+
+    (tree / "changed").write_text("IPSUM")
+    (tree / "removed").unlink()
+    (tree / "dir").gen("added", "sit")
+    with pytest.raises(AssertionError, match="does not match snapshot") as exc_info:
+        GoldenSnapshot(golden, "test").assert_match(tree)
+    assert str(exc_info.value).splitlines()[1:] == [
+        "  added (1): dir/added",
+        "  removed (1): removed",
+        "  changed (1): changed",
+        "run with --snapshot-update to update it",
+    ]
+
+    os.utime(golden / "test" / "same", ns=(0, 0))
+    GoldenSnapshot(golden, "test", update=True).assert_match(tree)
+    assert (golden / "test").cat() == tree.cat()
+    assert (golden / "test" / "same").stat().st_mtime_ns == 0
+    GoldenSnapshot(golden, "test").assert_match(tree)
+
+    # a hand edit that keeps the size is noticed by its mtime
+    (golden / "test" / "same").write_text("LOREM")
+    with pytest.raises(AssertionError, match="changed \\(1\\): same"):
+        GoldenSnapshot(golden, "test").assert_match(tree)
+
+
+def test_golden_snapshot_values(tmp_dir: TmpDir) -> None:
+    snapshot = GoldenSnapshot(tmp_dir, "test", update=True)
+    snapshot.assert_match({"b": [1, 2], "a": "lorem"})
+    snapshot.assert_match("ipsum")
+    snapshot.assert_match(None, name="named")
+    assert sorted(p.name for p in tmp_dir.iterdir()) == [
+        "test-1.json",
+        "test.json",
+        "test.named.json",
+    ]
+    assert snapshot.updated == [
+        tmp_dir / "test.json",
+        tmp_dir / "test-1.json",
+        tmp_dir / "test.named.json",
+    ]
+
+    snapshot = GoldenSnapshot(tmp_dir, "test")
+    snapshot.assert_match({"a": "lorem", "b": [1, 2]})
+    with pytest.raises(AssertionError, match='-"ipsum"\n\\+"dolor"'):
+        snapshot.assert_match("dolor")
+    with pytest.raises(AssertionError, match="does not exist"):
+        snapshot.assert_match(None, name="missing")
+
+
+def test_snapshot_update_option(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        test_golden="""
+        def test_tree(tmp_dir, snapshot):
+            tmp_dir.gen({"file": "lorem", "dir": {"file": "ipsum"}})
+            snapshot.assert_match(tmp_dir)
+            snapshot.assert_match({"value": 1}, name="value")
+        """
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(["*snapshot * does not exist"])
+
+    result = pytester.runpytest("--snapshot-update")
+    result.assert_outcomes(passed=1)
+    snapshots = pytester.path / "__snapshots__" / "test_golden"
+    assert TmpDir(snapshots / "test_tree").cat() == {
+        "file": "lorem",
+        "dir": {"file": "ipsum"},
+    }
+    assert json.loads((snapshots / "test_tree.value.json").read_text()) == {"value": 1}
+
+    result = pytester.runpytest()
+    result.assert_outcomes(passed=1)
+
+
 def test_matcher_repr(matcher: Type[Matcher]) -> None:
     assert repr(matcher.any) == "any"
     assert repr(matcher.attrs(foo="foo")) == "attrs(foo='foo')"
@@ -105,9 +633,62 @@ def test_matcher_repr(matcher: Type[Matcher]) -> None:
     assert repr(matcher.instance_of(str)) == "instance_of(str)"
     assert repr(matcher.instance_of((str, bytes))) == "instance_of((str, bytes))"
     assert repr(matcher.unordered("foo", "bar")) == "unordered('foo', 'bar')"
+    assert repr(matcher.each(matcher.instance_of(int))) == "each(instance_of(int))"
+    assert repr(matcher.contains(1, "a")) == "contains(1, 'a')"
+    assert repr(matcher.prefix(1, 2)) == "prefix(1, 2)"
     assert repr(matcher.re(r"^plots\.csv-\w+$")) == "regex(r'^plots\\.csv-\\w+$')"
 
 
+@pytest.fixture
+def repr_budget() -> Iterator[None]:
+    previous = _repr.configure()
+    yield
+    _repr.configure(*previous)
+
+
+@pytest.mark.usefixtures("repr_budget")
+def test_matcher_repr_budget(M: Type[Matcher]) -> None:
+    _repr.configure(40, 3)
+    assert repr(M.unordered(*range(100_000))) == (
+        "unordered(0, 1, 2, 3, 4, 5, 6, 7, 8, 9, ..."
+    )
+    assert repr(M.any_of("x" * 1_000_000)) == "any_of('" + "x" * 32 + "..."
+    # large allow-lists are not sorted, only their first items are looked at
+    allowed = M.any_of(*range(100_000, 0, -1))
+    with patch("builtins.sorted", side_effect=AssertionError):
+        assert repr(allowed) == "any_of(100000, 99999, 99998, 99997, 9999..."
+    assert repr(M.dict(a=[{"b": {"c": 1}}], d=M.attrs(e=(1,), f=set()))) == (
+        "M.dict(a=[{'b': ...}], d=attrs(e=(1,), f..."
+    )
+    nested = M.dict(a=M.dict(b=M.dict(c=M.dict(d=1))))
+    assert repr(nested) == "M.dict(a=M.dict(b=M.dict(c=...)))"
+
+    _repr.configure(1000, 10)
+    assert repr(M.dict(a=[{"b": {"c": 1}}], d=M.attrs(e=(1,), f=set()))) == (
+        "M.dict(a=[{'b': {'c': 1}}], d=attrs(e=(1,), f=set()))"
+    )
+    assert repr(M.any_of(frozenset({1}), "b")) == "any_of(frozenset({1}), 'b')"
+
+
+def test_matcher_repr_budget_ini(pytester: "pytest.Pytester") -> None:
+    pytester.makeini(
+        """
+        [pytest]
+        matcher_repr_max_chars = 20
+        """
+    )
+    pytester.makepyfile(
+        """
+        from pytest_test_utils.matchers import Matcher as M
+
+        def test_repr():
+            assert repr(M.unordered(*range(100))) == "unordered(0, 1, 2, 3..."
+        """
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(passed=1)
+
+
 def test_matcher_dict(matcher: Type[Matcher]) -> None:
     # pytest needs len() to be there when there is no explanation
     assert len(matcher.dict({"a": 1, "b": 2})) == 2
@@ -131,6 +712,32 @@ def test_matcher_regex(matcher: Type[Matcher]) -> None:
     assert matcher.regex("^500 Internal") != "200 OK"
 
 
+def test_matcher_regex_bytes(matcher: Type[Matcher]) -> None:
+    assert matcher.regex(r"^500 \w+") == b"500 Internal Error"
+    assert matcher.regex(rb"^500 \w+") == "500 Internal Error"
+    assert matcher.regex(r"^500 \w+") != b"200 OK"
+    assert matcher.regex("café".encode()) == "café"
+    assert matcher.regex("^café$") == "café".encode()
+
+
+def test_matcher_regex_modes(matcher: Type[Matcher]) -> None:
+    assert matcher.regex(r"\d+") == "abc 123"
+    assert matcher.regex(r"\d+", mode="match") != "abc 123"
+    assert matcher.regex(r"\d+", mode="match") == "123 abc"
+    assert matcher.regex(r"\d+", mode="fullmatch") != "123 abc"
+    assert matcher.regex(r"\d+", mode="fullmatch") == "123"
+    assert (
+        repr(matcher.regex(r"\d+", mode="fullmatch"))
+        == "regex(r'\\d+', mode='fullmatch')"
+    )
+    with pytest.raises(ValueError):
+        matcher.regex(r"\d+", mode="find")
+
+
+def test_matcher_regex_compile_cache(matcher: Type[Matcher]) -> None:
+    assert matcher.regex(r"^\w+$")._regex is matcher.regex(r"^\w+$")._regex
+
+
 def test_matcher_attrs(matcher: Type[Matcher]) -> None:
     obj = SimpleNamespace(foo="foo", bar="bar")
     assert obj == matcher.attrs(foo="foo")
@@ -142,6 +749,45 @@ def test_matcher_attrs_nested(matcher: Type[Matcher]) -> None:
     assert obj == matcher.attrs(nested=matcher.attrs(foo="foo"))
 
 
+def test_matcher_mismatch_explain(M: Type[Matcher]) -> None:
+    obj = SimpleNamespace(
+        name="foo", meta={"size": 3, "tags": ["a", "b"], "owner": {"id": 1}}
+    )
+
+    pattern = M.attrs(name="foo", meta=M.dict(size=3, owner=M.dict(id=2)))
+    assert obj != pattern
+    assert pattern.explain() == [
+        "Mismatch at .meta['owner']['id']:",
+        "  expected: 2",
+        "  actual:   1",
+    ]
+
+    pattern = M.attrs(meta=M.dict(missing="x"))
+    assert obj != pattern
+    assert pattern.explain() == [
+        "Mismatch at .meta['missing']:",
+        "  expected: 'x'",
+        "  actual:   <missing>",
+    ]
+
+    pattern = M.attrs(meta=M.dict(tags=M.unordered("b", "c")))
+    assert obj != pattern
+    assert pattern.explain() == [
+        "Mismatch at .meta['tags']:",
+        "  Missing items (1):",
+        "    'c'",
+        "  Extra items (1):",
+        "    'a'",
+    ]
+
+    # a successful comparison clears the last mismatch
+    pattern = M.attrs(name="bar")
+    assert obj != pattern
+    obj.name = "bar"
+    assert obj == pattern
+    assert pattern.explain() == []
+
+
 def test_matcher_any(matcher: Type[Matcher]) -> None:
     assert matcher.any == 5
     assert bool(matcher.any)
@@ -169,6 +815,180 @@ def test_matcher_unordered(matcher: Type[Matcher]) -> None:
     assert lst != matcher.unordered("foo", "bar")
 
 
+def test_matcher_unordered_unorderable(M: Type[Matcher]) -> None:
+    actual = [{"a": 1}, "foo", 1, None, [1, {"b": 2}], {"a": 1}]
+    assert actual == M.unordered(None, {"a": 1}, 1, [1, {"b": 2}], {"a": 1}, "foo")
+    assert actual != M.unordered(None, {"a": 1}, 1, [1, {"b": 2}], {"a": 2}, "foo")
+    assert iter(actual) == M.unordered(*reversed(actual))
+
+
+def test_matcher_unordered_matchers(M: Type[Matcher]) -> None:
+    # a greedy match would give "foo" to M.any and then fail on M.re("^f")
+    assert ["foo", "bar"] == M.unordered(M.any, M.re("^f"))
+    assert [{"a": 1}, {"a": 2}] == M.unordered(M.dict(a=2), {"a": 1})
+    assert ["foo", "bar"] != M.unordered(M.re("^f"), M.re("^f"))
+    # True equals 1, but only True is a bool; the order must not matter
+    assert [1, True] == M.unordered(1, M.instance_of(bool))
+    assert [True, 1] == M.unordered(1, M.instance_of(bool))
+    assert [True, 1.0, "a"] == M.unordered(M.any, 1.0, M.instance_of(bool))
+
+
+def test_matcher_unordered_large_mismatch(M: Type[Matcher]) -> None:
+    start = perf_counter()
+    matcher = M.unordered(*range(100_000), M.instance_of(str))
+    assert list(range(100_000, 200_000)) != matcher
+    assert len(matcher.missing) == len(matcher.extra) + 1 == 100_001
+    assert isinstance(matcher.missing[-1], matchers.instance_of)
+    assert perf_counter() - start < 5
+
+
+def test_matcher_unordered_missing_extra(M: Type[Matcher]) -> None:
+    matcher = M.unordered("foo", "foo", M.re("^b"), {"a": 1})
+    assert ["foo", "baz", "qux", {"a": 2}] != matcher
+    assert matcher.missing == ["foo", {"a": 1}]
+    assert matcher.extra == ["qux", {"a": 2}]
+    assert matcher.explain() == [
+        "Missing items (2):",
+        "  'foo'",
+        "  {'a': 1}",
+        "Extra items (2):",
+        "  'qux'",
+        "  {'a': 2}",
+    ]
+
+    assert ["foo", "foo", "bar", {"a": 1}] == matcher
+    assert matcher.missing == matcher.extra == []
+
+
+def test_matcher_each(M: Type[Matcher]) -> None:
+    assert [1, 2, 3] == M.each(M.instance_of(int))
+    assert [] == M.each(M.instance_of(int))
+    assert (i for i in range(3)) != M.each(1)
+
+    matcher = M.each(M.dict(id=M.instance_of(int)))
+    items = iter([{"id": 1}, {"id": "2"}, {"id": 3}])
+    assert items != matcher
+    assert next(items) == {"id": 3}
+    assert matcher.explain() == [
+        "Mismatch at [1]['id']:",
+        "  expected: instance_of(int)",
+        "  actual:   '2'",
+    ]
+
+
+def test_matcher_prefix(M: Type[Matcher]) -> None:
+    items = iter(range(10))
+    assert items == M.prefix(0, 1, M.any)
+    assert next(items) == 3
+    assert range(3) == M.prefix()
+    assert range(3) == M.prefix(0, 1, 2)
+
+    matcher = M.prefix(0, 2)
+    assert range(3) != matcher
+    assert matcher.explain() == ["Mismatch at [1]:", "  expected: 2", "  actual:   1"]
+    assert [0] != matcher
+    assert matcher.explain() == [
+        "Mismatch at [1]:",
+        "  expected: 2",
+        "  actual:   <missing>",
+    ]
+
+
+def test_matcher_contains(M: Type[Matcher]) -> None:
+    items = iter(range(1_000_000))
+    assert items == M.contains(5, 1, M.any_of(3, 4))
+    # stops as soon as all of the items were found
+    assert next(items) == 6
+    assert [] == M.contains()
+    assert [1, 1] == M.contains(1, 1)
+    assert [1] != M.contains(1, 1)
+    assert [{"a": [1]}, {"a": [2]}] == M.contains({"a": [2]})
+
+    # M.any must not take the only item that the stricter matcher needs
+    assert ["foo", 1] == M.contains(M.any, M.instance_of(str))
+    assert ["foo", 1] == M.contains(M.instance_of(str), M.any)
+    assert ["foo"] != M.contains(M.instance_of(str), M.any)
+    # a bucket hit must not take the only item a pending matcher can use
+    assert [True, 1] == M.contains(1, M.instance_of(bool))
+    assert [True, 1.0, "a", {"k": 1}, 1.0] == M.contains(
+        1.0, M.any_of(0, 1), M.instance_of(int)
+    )
+
+    int_matcher = M.instance_of(int)
+    matcher = M.contains("foo", M.re("^b"), int_matcher)
+    assert (x for x in ["foo", "qux", "baz"]) != matcher
+    assert len(matcher.missing) == 1
+    assert matcher.missing[0] is int_matcher
+    assert matcher.explain() == ["Missing items (1):", "  instance_of(int)"]
+    assert [{"a": 1}, {"a": 2, "b": 3}] == M.contains(M.dict(a=2))
+
+
+def test_matcher_unordered_assertrepr(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        from pytest_test_utils.matchers import Matcher as M
+
+        def test_unordered():
+            assert list(range(1000)) == M.unordered(*range(1, 1001))
+        """
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "E       assert [[]0, 1, 2, 3, 4, 5, ...] == unordered(1, 2, 3, *",
+            "E         Missing items (1):",
+            "E           1000",
+            "E         Extra items (1):",
+            "E           0",
+        ]
+    )
+
+
+def test_matcher_mismatch_assertrepr(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        from pytest_test_utils.matchers import Matcher as M
+
+        def test_mismatch():
+            payload = {"items": [{"id": i} for i in range(100_000)], "status": "ok"}
+            assert payload == M.dict(status="failed")
+        """
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "E       *assert {'items': *, 'status': 'ok'} == M.dict(status='failed')",
+            "E         Mismatch at [[]'status']:",
+            "E           expected: 'failed'",
+            "E           actual:   'ok'",
+        ]
+    )
+
+
+def test_matcher_streaming_assertrepr(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        from pytest_test_utils.matchers import Matcher as M
+
+        def test_each():
+            rows = ({"id": i, "ok": i != 5} for i in range(1_000_000))
+            assert rows == M.each(M.dict(ok=True))
+        """
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "E       *assert <generator object *> == each(M.dict(ok=True))",
+            "E         Mismatch at [[]5][[]'ok']:",
+            "E           expected: True",
+            "E           actual:   False",
+        ]
+    )
+
+
 def test_matcher_any_of(matcher: Type[Matcher]) -> None:
     lst1 = ["foo", "foobar"]
     lst2 = ["bar", "foobar"]
@@ -184,6 +1004,88 @@ def test_matcher_any_of(matcher: Type[Matcher]) -> None:
     assert matcher.any_of("foo", "bar") not in ["foobar"]
 
 
+def test_matcher_compile(M: Type[Matcher]) -> None:
+    pattern = M(
+        name=M.re("^foo"),
+        kind="a",
+        meta=M.dict(size=M.instance_of(int), tags=["x"], extra=M.any),
+        nested=M.attrs(value=M.any_of(1, 2)),
+    )
+    compiled = M.compile(pattern)
+    assert repr(compiled) == f"compiled({pattern!r})"
+
+    def make(**kwargs: object) -> SimpleNamespace:
+        defaults = {
+            "name": "foobar",
+            "kind": "a",
+            "meta": {"size": 1, "tags": ["x"]},
+            "nested": SimpleNamespace(value=2),
+        }
+        return SimpleNamespace(**{**defaults, **kwargs})
+
+    candidates = [
+        make(),
+        make(name="barfoo"),
+        make(name="foo"),
+        make(kind="b"),
+        make(meta={"size": "1", "tags": ["x"]}),
+        make(meta={"size": 1, "tags": ["y"]}),
+        make(nested=SimpleNamespace(value=3)),
+    ]
+    expected = [candidate == pattern for candidate in candidates]
+    assert expected == [True, False, True, False, False, False, False]
+    assert compiled.match_all(candidates) == expected
+    assert candidates[0] == compiled
+    # unlike the uncompiled matchers, these are mismatches rather than errors
+    assert make(meta=[]) != compiled
+    assert SimpleNamespace(name="foo") != compiled
+
+    others = [make(name=b"foo"), make(name=1), make(meta=[]), make(meta={"size": 1})]
+    assert compiled.match_all(others) == [True, False, False, False]
+    assert [other == compiled for other in others] == [True, False, False, False]
+    # falls back to comparing one candidate at a time
+    assert compiled.match_all([*candidates, SimpleNamespace(name="foo")]) == [
+        *expected,
+        False,
+    ]
+
+
+def test_matcher_compile_is_faster(M: Type[Matcher]) -> None:
+    pattern = M(name=M.re(r"^obj\d+$"), id=M.instance_of(int), meta=M.dict(t="x"))
+    records = [
+        SimpleNamespace(name=f"obj{i}", id=i, meta={"t": "x"}) for i in range(20_000)
+    ]
+    compiled = M.compile(pattern)
+
+    def best(func: Callable[[], object]) -> float:
+        times = []
+        for _ in range(5):
+            start = perf_counter()
+            func()
+            times.append(perf_counter() - start)
+        return min(times)
+
+    plain = best(lambda: [record == pattern for record in records])
+    assert best(lambda: compiled.match_all(records)) < plain / 1.5
+
+
+def test_matcher_any_of_mixed(M: Type[Matcher]) -> None:
+    matcher = M.any_of(1, "foo", None, {"a": [1]}, M.instance_of(float))
+    assert repr(M.any_of(4, 3)) == "any_of(3, 4)"
+    assert repr(M.any_of("foo", None)) == "any_of('foo', None)"
+
+    assert matcher == 1
+    assert matcher == "foo"
+    assert matcher is not None
+    assert matcher == {"a": [1]}
+    assert matcher == 1.5
+    assert matcher != 2
+    assert matcher != {"a": [2]}
+    assert matcher != ["foo"]
+    assert M.any_of({"a": M.any}) == {"a": 1}
+    assert M.any_of("foo", M.re("^bar")) == "barbaz"
+
+
 def test_approx_datetime_repr(matcher: Type[Matcher]) -> None:
     obj = matcher.approx(datetime(2021, 11, 29))
     assert repr(obj) == (
@@ -199,10 +1101,80 @@ def test_approx_datetime(matcher: Type[Matcher]) -> None:
         assert matcher.approx(expected) == datetime.now()
 
 
+def test_approx_datetime_subclass_and_zero_tolerance(M: Type[Matcher]) -> None:
+    class Timestamp(datetime):
+        pass
+
+    now = datetime(2021, 1, 1, 12)
+    assert M.approx(Timestamp(2021, 1, 1, 12)) == now
+    assert M.approx(now) == Timestamp(2021, 1, 1, 12, 0, 0, 1)
+    assert M.approx(now, abs=timedelta(0)) != now + timedelta(microseconds=1)
+    assert M.approx([now], abs=timedelta(0)) != [now + timedelta(microseconds=1)]
+    with pytest.raises(AssertionError, match="expected type of timedelta"):
+        assert M.approx(timedelta(1)) == now
+
+
 def test_approx_should_fallback_to_pytest(matcher: Type[Matcher]) -> None:
     assert matcher.approx(3.0 + 1e-6) == 3
 
 
+def test_approx_datetime_sequence(M: Type[Matcher]) -> None:
+    start = datetime(2021, 11, 29)
+    expected = [start + timedelta(minutes=i) for i in range(1000)]
+    actual = [value + timedelta(milliseconds=500) for value in expected]
+
+    assert actual == M.approx(expected)
+    assert tuple(actual) == M.approx(tuple(expected))
+    assert actual != M.approx(expected, abs=timedelta(milliseconds=100))
+    assert actual[:-1] != M.approx(expected)
+    assert ["foo"] * 1000 != M.approx(expected)
+
+    actual[500] += timedelta(seconds=2)
+    approx = M.approx(expected)
+    assert actual != approx
+    assert approx._repr_compare(actual) == [
+        "comparison failed at index 500",
+        f"Obtained: {actual[500]!r}",
+        f"Expected: {expected[500]!r} ± datetime.timedelta(seconds=1)",
+    ]
+
+    deltas = [timedelta(seconds=i) for i in range(10)]
+    assert [delta + timedelta(microseconds=1) for delta in deltas] == M.approx(deltas)
+    assert M.approx(timedelta(seconds=1)) == timedelta(seconds=1.5)
+
+
+def test_approx_datetime_sequence_tz_aware(M: Type[Matcher]) -> None:
+    start = datetime(2021, 11, 29, tzinfo=timezone.utc)
+    expected = [start + timedelta(hours=i) for i in range(10)]
+    actual = [value.astimezone(timezone(timedelta(hours=2))) for value in expected]
+    assert actual == M.approx(expected)
+    assert actual[::-1] != M.approx(expected)
+
+
+def test_approx_numpy_datetime64(M: Type[Matcher]) -> None:
+    np = pytest.importorskip("numpy")
+
+    expected = np.arange(
+        np.datetime64("2021-11-29"), np.datetime64("2021-12-29"), np.timedelta64(1, "s")
+    )
+    actual = expected + np.timedelta64(500, "ms")
+    assert actual == M.approx(expected)
+    assert M.approx(expected) == actual
+    assert actual != M.approx(expected, abs=timedelta(milliseconds=100))
+    assert actual[:-1] != M.approx(expected)
+    assert list(expected[:10].astype(datetime)) == M.approx(expected[:10])
+
+    actual[1234] = np.datetime64("NaT")
+    assert actual != M.approx(expected)
+    expected = expected.copy()
+    expected[1234] = np.datetime64("NaT")
+    assert actual == M.approx(expected)
+
+    deltas = np.arange(10).astype("timedelta64[s]")
+    assert deltas == M.approx(deltas + np.timedelta64(1, "us"))
+    assert deltas != M.approx(expected[:10])
+
+
 def test_matcher(matcher: Type[Matcher]) -> None:
     experiments = {
         "b05eec": {
@@ -281,3 +1253,373 @@ def test_wait_until_raises_timedouterror() -> None:
 
     assert perf_counter() == pytest.approx(start + 0.01, rel=1e-3)
     assert len(pred.call_args_list) > 1
+
+
+def test_wait_until_backoff() -> None:
+    pred = MagicMock(side_effect=[False, False, False, True])
+
+    with patch("pytest_test_utils.waiters.sleep") as sleep:
+        assert wait_until(pred, 10, pause=0.1, backoff=2, max_pause=0.3)
+    assert sleep.call_args_list == [call(0.1), call(0.2), call(0.3)]
+
+
+def test_wait_until_jitter() -> None:
+    pred = MagicMock(side_effect=[False] * 10 + [True])
+
+    with patch("pytest_test_utils.waiters.sleep") as sleep:
+        assert wait_until(pred, 10, pause=1, jitter=0.5)
+    delays = [args[0] for args, _ in sleep.call_args_list]
+    assert all(0.5 <= delay <= 1.5 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.parametrize("jitter", [-0.1, 1, 2])
+def test_wait_until_invalid_jitter(jitter: float) -> None:
+    pred = MagicMock(return_value=False)
+    with pytest.raises(ValueError, match=r"jitter must be in \[0, 1\)"):
+        wait_until(pred, 0.5, pause=0.01, jitter=jitter)
+    with pytest.raises(ValueError, match=r"jitter must be in \[0, 1\)"):
+        wait_until_all([pred], 0.5, pause=0.01, jitter=jitter)
+    pred.assert_not_called()
+
+    async def main() -> None:
+        with pytest.raises(ValueError, match=r"jitter must be in \[0, 1\)"):
+            await wait_until_async(pred, 0.5, pause=0.01, jitter=jitter)
+        with pytest.raises(ValueError, match=r"jitter must be in \[0, 1\)"):
+            await wait_until_all_async([pred], 0.5, pause=0.01, jitter=jitter)
+
+    asyncio.run(main())
+    pred.assert_not_called()
+
+
+def test_wait_until_wake_event() -> None:
+    event = threading.Event()
+    done = []
+
+    def finish() -> None:
+        done.append(True)
+        event.set()
+
+    threading.Timer(0.01, finish).start()
+    start = perf_counter()
+    assert wait_until(lambda: done, 5, pause=5, wake=event)
+    assert perf_counter() - start < 1
+    assert not event.is_set()
+
+
+def test_wait_until_wake_socket() -> None:
+    rsock, wsock = socket.socketpair()
+    with rsock, wsock:
+        threading.Timer(0.01, wsock.send, args=(b"x",)).start()
+        start = perf_counter()
+        assert wait_until(
+            lambda: rsock.recv(1, socket.MSG_PEEK), 5, pause=5, wake=rsock
+        )
+        assert perf_counter() - start < 1
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+def test_wait_until_wake_file(tmp_dir: TmpDir, inotify: bool) -> None:
+    path = tmp_dir / "file"
+    threading.Timer(0.01, path.write_text, args=("lorem",)).start()
+
+    with ExitStack() as stack:
+        if not inotify:
+            stack.enter_context(
+                patch("pytest_test_utils.waiters._inotify_init", return_value=None)
+            )
+        start = perf_counter()
+        assert wait_until(path.exists, 5, pause=5, wake=path)
+        assert perf_counter() - start < 1
+
+
+def test_wait_until_async() -> None:
+    async def main() -> None:
+        event = asyncio.Event()
+        pred = AsyncMock(side_effect=[False, True])
+        asyncio.get_running_loop().call_later(0.01, event.set)
+
+        start = perf_counter()
+        assert await wait_until_async(pred, 5, pause=5, wake=event)
+        assert perf_counter() - start < 1
+        assert len(pred.call_args_list) == 2
+
+        with pytest.raises(TimedOutError):
+            await wait_until_async(lambda: False, 0.01, pause=0.001, backoff=2)
+
+    asyncio.run(main())
+
+
+def test_wait_until_all() -> None:
+    first = MagicMock(side_effect=[False, "first"])
+    second = MagicMock(side_effect=[False, False, "second"])
+
+    start = perf_counter()
+    assert wait_until_all([first, second], 5, pause=0.001) == ["first", "second"]
+    assert perf_counter() - start < 1
+
+
+def test_wait_until_all_raises_timedouterror() -> None:
+    def ready() -> bool:
+        return True
+
+    def never() -> bool:
+        return False
+
+    start = perf_counter()
+    with pytest.raises(TimedOutError) as exc_info:
+        wait_until_all([ready, never], 0.05, pause=0.001)
+    assert perf_counter() - start < 1
+
+    message = str(exc_info.value)
+    assert "waiting for 1 of 2 conditions" in message
+    assert "test_wait_until_all_raises_timedouterror.<locals>.ready: true" in message
+    assert (
+        "test_wait_until_all_raises_timedouterror.<locals>.never: not true" in message
+    )
+
+
+def test_wait_until_all_propagates_errors() -> None:
+    never = MagicMock(return_value=False)
+    fails = MagicMock(side_effect=ZeroDivisionError)
+    with pytest.raises(ZeroDivisionError):
+        wait_until_all([never, fails], 5, pause=0.001)
+
+
+def test_wait_until_all_async() -> None:
+    async def main() -> None:
+        first = AsyncMock(side_effect=[False, "first"])
+        second = MagicMock(side_effect=[False, False, "second"])
+        results = await wait_until_all_async([first, second], 5, pause=0.001)
+        assert results == ["first", "second"]
+
+        ready = AsyncMock(return_value=True)
+        never = MagicMock(return_value=False)
+        with pytest.raises(TimedOutError, match="waiting for 1 of 2 conditions"):
+            await wait_until_all_async([ready, never], 0.01, pause=0.001)
+
+    asyncio.run(main())
+
+
+def test_wait_until_listener() -> None:
+    records: List[WaitRecord] = []
+    pred = MagicMock(side_effect=[False, True])
+
+    add_listener(records.append)
+    try:
+        line = sys._getframe().f_lineno + 1
+        wait_until(pred, 5, pause=0.001)
+        with pytest.raises(TimedOutError):
+            wait_until(lambda: False, 0.001, pause=0.001)
+    finally:
+        remove_listener(records.append)
+
+    assert records == [
+        (f"{__file__}:{line}", 2, Matcher.any, Matcher.any, Matcher.any, "passed"),
+        (Matcher.any, Matcher.any, Matcher.any, Matcher.any, Matcher.any, "timeout"),
+    ]
+
+
+def test_wait_durations_report(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        from pytest_test_utils.waiters import wait_until
+
+        def test_wait():
+            wait_until(lambda: True, 1)
+        """
+    )
+    result = pytester.runpytest(
+        "--wait-durations=0", "--wait-durations-json=out.json", "--junitxml=junit.xml"
+    )
+
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*= slowest wait_until calls =*",
+            "*s passed  1 polls (pred *s, sleep *s) test_wait_durations_report.py:4 *",
+        ]
+    )
+    data = json.loads((pytester.path / "out.json").read_text())
+    assert data == [
+        Matcher.dict(
+            nodeid="test_wait_durations_report.py::test_wait",
+            polls=1,
+            outcome="passed",
+        )
+    ]
+    assert "<property" not in (pytester.path / "junit.xml").read_text()
+
+
+def test_wait_durations_from_workers(
+    tmp_dir: TmpDir, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # with pytest-xdist, the controller only sees the reports of the workers
+    record = WaitRecord("test_x.py:3", 2, 0.5, 0.1, 0.4, "passed")
+    report = pytest.TestReport(
+        "test_x.py::test_x",
+        ("test_x.py", 1, "test_x"),
+        {},
+        "passed",
+        None,
+        "call",
+        test_utils_wait_until=[record._asdict()],
+    )
+    # serialized like pytest-xdist does
+    report = pytest.TestReport._from_json(report._to_json())
+    controller = WaitReporter(None, os.fspath(tmp_dir / "out.json"))
+    controller.pytest_runtest_logreport(report)
+
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw0")
+    controller.pytest_sessionfinish()
+    assert not (tmp_dir / "out.json").exists()
+
+    monkeypatch.delenv("PYTEST_XDIST_WORKER")
+    controller.pytest_sessionfinish()
+    data = json.loads((tmp_dir / "out.json").read_text())
+    assert data == [{"nodeid": "test_x.py::test_x", **record._asdict()}]
+
+
+def test_perf_measure(perf: Perf, tmp_dir: TmpDir) -> None:
+    with perf.measure("alloc", memory=True) as result:
+        data = bytearray(1 << 20)
+        (tmp_dir / "file").write_bytes(data)
+    assert result.wall >= 0
+    assert result.cpu >= 0
+    assert result.peak_mem is not None
+    assert result.peak_mem >= 1 << 20
+    if result.io_bytes is not None:
+        assert result.io_bytes >= 1 << 20
+
+    with perf.measure("outer", memory=True) as outer:
+        data = bytearray(2 << 20)
+        del data
+        with perf.measure("inner", memory=True) as inner:
+            pass
+    assert inner.peak_mem is not None
+    assert inner.peak_mem < 1 << 20
+    assert outer.peak_mem is not None
+    assert outer.peak_mem >= 2 << 20
+
+    with pytest.raises(BudgetExceeded, match="slow is over budget: wall .*s > 0.00us"):
+        with perf.measure("slow", wall=0):
+            sum(range(10_000))
+    assert [record.name for record in perf.records] == [
+        "alloc",
+        "inner",
+        "outer",
+        "slow",
+    ]
+    assert perf.records[-1].budget == Budget(wall=0)
+
+
+def test_perf_budget_marker(pytester: "pytest.Pytester") -> None:
+    pytester.makepyfile(
+        """
+        import time
+        import pytest
+
+        @pytest.mark.perf_budget(wall=10, peak_mem=1 << 30)
+        def test_within():
+            pass
+
+        @pytest.mark.perf_budget(cpu=0)
+        def test_over():
+            sum(range(100_000))
+
+        def test_block(perf):
+            with perf.measure("sleep"):
+                time.sleep(0.01)
+        """
+    )
+    result = pytester.runpytest("--perf-json=perf.json", "--junitxml=junit.xml")
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*over perf budget: cpu *s > 0.00us",
+            "*= perf measurements =*",
+            "wall *s, cpu *s, peak_mem *B*  test_perf_budget_marker.py::test_within",
+            "wall *s, cpu *s*  test_perf_budget_marker.py::test_over"
+            "  OVER BUDGET: cpu *",
+            "wall *s, cpu *s*  test_perf_budget_marker.py::test_block [[]sleep[]]",
+        ]
+    )
+    data = json.loads((pytester.path / "perf.json").read_text())
+    assert data == [
+        Matcher.dict(name=None, exceeded=False, peak_mem=Matcher.instance_of(int)),
+        Matcher.dict(name=None, exceeded=True, budget=Matcher.dict(cpu=0)),
+        Matcher.dict(
+            nodeid="test_perf_budget_marker.py::test_block",
+            name="sleep",
+            wall=Matcher.approx(0.01, abs=0.5),
+        ),
+    ]
+    # users' JUnit XML is left alone
+    assert "<property" not in (pytester.path / "junit.xml").read_text()
+
+
+def test_perf_report_from_workers(
+    tmp_dir: TmpDir, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # with pytest-xdist, the controller only sees the reports of the workers
+    record = PerfRecord("block", Measurement(0.5, 0.25), Budget(wall=0.1))
+    report = pytest.TestReport(
+        "test_x.py::test_x",
+        ("test_x.py", 1, "test_x"),
+        {},
+        "passed",
+        None,
+        "teardown",
+        test_utils_perf=[record.asdict()],
+    )
+    # serialized like pytest-xdist does
+    report = pytest.TestReport._from_json(report._to_json())
+    controller = PerfReporter(os.fspath(tmp_dir / "perf.json"))
+    controller.pytest_runtest_logreport(report)
+    assert controller.records == [("test_x.py::test_x", Matcher.any)]
+    assert controller.records[0][1].exceeded == ["wall 500.00ms > 100.00ms"]
+
+    monkeypatch.setenv("PYTEST_XDIST_WORKER", "gw0")
+    controller.pytest_sessionfinish()
+    assert not (tmp_dir / "perf.json").exists()
+
+    monkeypatch.delenv("PYTEST_XDIST_WORKER")
+    controller.pytest_sessionfinish()
+    data = json.loads((tmp_dir / "perf.json").read_text())
+    assert data == [
+        Matcher.dict(nodeid="test_x.py::test_x", name="block", wall=0.5, exceeded=True)
+    ]
+
+
+def test_plugin_import_is_lazy() -> None:
+    # pytest is imported first, so that only the plugin's own cost is measured
+    code = "import pytest; import pytest_test_utils.pytest_plugin"
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = [
+        line.rsplit("|", 1)[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    ]
+    assert sorted(
+        name for name in imported if name.startswith("pytest_test_utils")
+    ) == [
+        "pytest_test_utils",
+        "pytest_test_utils._ram",
+        "pytest_test_utils._repr",
+        "pytest_test_utils.pytest_plugin",
+    ]
+
+
+def test_lazy_public_names() -> None:
+    import pytest_test_utils
+
+    assert pytest_test_utils.TmpDir is TmpDir
+    assert pytest_test_utils.matchers.Matcher is Matcher
+    assert set(pytest_test_utils.__all__) <= set(dir(pytest_test_utils))
+    with pytest.raises(AttributeError, match="has no attribute 'missing'"):
+        pytest_test_utils.missing  # noqa: B018